@@ -0,0 +1,190 @@
+import asyncio
+import logging
+import random
+import threading
+import time
+import weakref
+from collections import Counter
+
+import httpx
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+logger = logging.getLogger("backend")
+
+
+class CircuitOpenError(requests.RequestException):
+    """Raised without calling the microservice while it is considered down."""
+
+
+class CircuitBreaker:
+    """
+    Fails fast after failure_threshold consecutive failures, for reset_timeout seconds.
+    Then one call is let through, its outcome closes or reopens the circuit.
+    """
+
+    def __init__(self, failure_threshold, reset_timeout):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self.probing = False
+        self.counts = Counter()
+        self._lock = threading.Lock()
+
+    def before_call(self):
+        with self._lock:
+            if self.opened_at is None:
+                return
+            if self.probing or time.monotonic() - self.opened_at < self.reset_timeout:
+                self.counts["circuit_rejected"] += 1
+                raise CircuitOpenError("Price microservice is unavailable, try again later.")
+            self.probing = True
+
+    def record(self, success):
+        with self._lock:
+            self.probing = False
+            if success:
+                self.failures = 0
+                self.opened_at = None
+                return
+            self.failures += 1
+            if self.opened_at is not None or self.failures >= self.failure_threshold:
+                if self.opened_at is None:
+                    self.counts["circuit_opened"] += 1
+                self.opened_at = time.monotonic()
+
+    def take_counts(self):
+        """How often the circuit opened and rejected a call since the last take."""
+        with self._lock:
+            counts, self.counts = self.counts, Counter()
+        return counts
+
+
+class MicroserviceClient:
+    """
+    Shared client for every call to the price microservice.
+    Each thread gets its own Session, all of them share one keep-alive connection pool.
+    GETs are idempotent and retried on connection errors and 502/503/504 with jittered backoff.
+    """
+
+    def __init__(self, base_url):
+        self.base_url = base_url
+        self.timeout = (settings.MICROSERVICE_CONNECT_TIMEOUT, settings.MICROSERVICE_READ_TIMEOUT)
+        retry = Retry(
+            total=settings.MICROSERVICE_RETRIES,
+            read=1,  # A read timeout already waited the full read timeout, retry it only once
+            backoff_factor=settings.MICROSERVICE_RETRY_BACKOFF,
+            backoff_jitter=settings.MICROSERVICE_RETRY_BACKOFF,
+            status_forcelist=(502, 503, 504),
+            allowed_methods=frozenset({"GET"}),
+            raise_on_status=False,
+        )
+        self.adapter = HTTPAdapter(pool_connections=1, pool_maxsize=settings.MICROSERVICE_POOL_SIZE,
+                                   max_retries=retry)
+        self.breaker = CircuitBreaker(settings.MICROSERVICE_CIRCUIT_THRESHOLD, settings.MICROSERVICE_CIRCUIT_RESET)
+        self._local = threading.local()
+        self._stats = Counter()
+        self._stats_lock = threading.Lock()
+
+    @property
+    def session(self):
+        session = getattr(self._local, "session", None)
+        if session is None:
+            session = requests.Session()
+            session.mount("http://", self.adapter)
+            session.mount("https://", self.adapter)
+            self._local.session = session
+        return session
+
+    def get(self, path, endpoint=None, timeout=None, **kwargs):
+        """
+        GET base_url + path and return the response, raising requests.RequestException on failure.
+        endpoint names the call in the latency stats, it defaults to the first path segment.
+        """
+        endpoint = endpoint or path.strip("/").split("/")[0]
+        self.breaker.before_call()
+
+        started = time.perf_counter()
+        success = False
+        try:
+            response = self.session.get(f"{self.base_url}{path}", timeout=timeout or self.timeout, **kwargs)
+            success = response.status_code < 500
+            response.raise_for_status()
+            return response
+        finally:
+            self.breaker.record(success)
+            self._record(endpoint, time.perf_counter() - started, success)
+
+    def _record(self, endpoint, seconds, success):
+        with self._stats_lock:
+            self._stats[f"{endpoint}:calls"] += 1
+            self._stats[f"{endpoint}:errors"] += not success
+            self._stats[f"{endpoint}:seconds"] += seconds
+        logger.debug(f"Microservice {endpoint} took {seconds * 1000:.1f}ms")
+
+    def take_stats(self):
+        """
+        Calls, errors and seconds spent per endpoint, and the circuit breaker counts, since the
+        last take. price_cache flushes them to Redis so price_cache_stats sums every worker.
+        """
+        with self._stats_lock:
+            stats, self._stats = self._stats, Counter()
+        return stats + self.breaker.take_counts()
+
+
+class AsyncMicroserviceClient:
+    """
+    Async counterpart of MicroserviceClient for the async views, sharing its circuit breaker and stats.
+    Every event loop gets its own keep-alive pool. Failures raise requests.RequestException,
+    like the sync client, so callers handle both the same way.
+    """
+
+    retry_statuses = (502, 503, 504)
+
+    def __init__(self, client):
+        self.client = client
+        self.timeout = httpx.Timeout(settings.MICROSERVICE_READ_TIMEOUT, connect=settings.MICROSERVICE_CONNECT_TIMEOUT)
+        self.limits = httpx.Limits(max_connections=settings.MICROSERVICE_POOL_SIZE,
+                                   max_keepalive_connections=settings.MICROSERVICE_POOL_SIZE)
+        self._sessions = weakref.WeakKeyDictionary()
+
+    @property
+    def session(self):
+        loop = asyncio.get_running_loop()
+        session = self._sessions.get(loop)
+        if session is None:
+            transport = httpx.AsyncHTTPTransport(retries=settings.MICROSERVICE_RETRIES, limits=self.limits)
+            session = httpx.AsyncClient(base_url=self.client.base_url, timeout=self.timeout, transport=transport)
+            self._sessions[loop] = session
+        return session
+
+    async def get(self, path, endpoint=None, **kwargs):
+        """GET base_url + path, retrying 502/503/504 with jittered backoff like the sync client."""
+        endpoint = endpoint or path.strip("/").split("/")[0]
+        self.client.breaker.before_call()
+
+        started = time.perf_counter()
+        success = False
+        try:
+            for attempt in range(settings.MICROSERVICE_RETRIES + 1):
+                if attempt:
+                    backoff = settings.MICROSERVICE_RETRY_BACKOFF * 2 ** (attempt - 1)
+                    await asyncio.sleep(backoff + random.uniform(0, settings.MICROSERVICE_RETRY_BACKOFF))
+                response = await self.session.get(path, **kwargs)
+                if response.status_code not in self.retry_statuses:
+                    break
+            success = response.status_code < 500
+            response.raise_for_status()
+            return response
+        except httpx.HTTPError as e:
+            raise requests.RequestException(str(e)) from e
+        finally:
+            self.client.breaker.record(success)
+            self.client._record(endpoint, time.perf_counter() - started, success)
+
+
+microservice = MicroserviceClient(settings.FETCH_PRICE_MICRO_SERVICE)
+async_microservice = AsyncMicroserviceClient(microservice)
@@ -7,6 +7,7 @@ response_message = {
     205: "Transaction created successfully",
     206: "Box closed successfully",
     207: "Transaction deleted successfully",
+    208: "Transactions imported",
 
     400: "The value you provided is not valid",
     401: "Email Already registered",
@@ -14,6 +15,7 @@ response_message = {
     403: "Invalid Credentials",
     404: "Not found",
     407: "You cannot delete closed box transactions",
+    408: "Only the latest transaction of a box can be deleted",
 
     500: "Unexpected error accord please try again later.."
 }
@@ -31,5 +33,9 @@ serializer_response_message = {
     10: "There is no box for this coin",
     11: "You can't close this box, the total amount of the box must be zero",
     12: "There is no box with this id",
-    13: "Invalid datetime format. Please use 'YYYY-MM-DD HH:MM:SS'. Example: '2024-02-04 15:30:00'."
+    13: "Invalid datetime format. Please use 'YYYY-MM-DD HH:MM:SS'. Example: '2024-02-04 15:30:00'.",
+    14: "Upload the CSV file in the 'file' field",
+    15: "Too many rows, import at most {} per file",
+    16: "None of the rows could be imported",
+    17: "The file could not be read, upload a UTF-8 encoded CSV",
 }
\ No newline at end of file
@@ -195,4 +195,39 @@ LOGGING = {
 }
 
 FETCH_PRICE_MICRO_SERVICE = os.getenv('FETCH_PRICE_MICRO_SERVICE')
-MINIO_ACCESS_ENDPOINT = os.getenv("MINIO_ACCESS_ENDPOINT")
\ No newline at end of file
+MINIO_ACCESS_ENDPOINT = os.getenv("MINIO_ACCESS_ENDPOINT")
+# Icon variant stored for new coins, the box list shows icons at 32px so 64px covers 2x screens
+COIN_ICON_SIZE = int(os.getenv("COIN_ICON_SIZE", 64))
+COIN_ICON_FORMAT = os.getenv("COIN_ICON_FORMAT", "webp")
+# Shared price cache, one Redis key per symbol
+PRICE_CACHE_TIMEOUT = int(os.getenv("PRICE_CACHE_TIMEOUT", 60))
+# A worker fetching a symbol holds its lock for at most this long
+PRICE_LOCK_TIMEOUT = int(os.getenv("PRICE_LOCK_TIMEOUT", 30))
+# How long a request waits for symbols another worker is fetching
+PRICE_WAIT_TIMEOUT = float(os.getenv("PRICE_WAIT_TIMEOUT", 5))
+
+# Pooled client for the price microservice
+MICROSERVICE_CONNECT_TIMEOUT = float(os.getenv("MICROSERVICE_CONNECT_TIMEOUT", 2))
+MICROSERVICE_READ_TIMEOUT = float(os.getenv("MICROSERVICE_READ_TIMEOUT", 10))
+MICROSERVICE_RETRIES = int(os.getenv("MICROSERVICE_RETRIES", 2))
+MICROSERVICE_RETRY_BACKOFF = float(os.getenv("MICROSERVICE_RETRY_BACKOFF", 0.2))
+MICROSERVICE_POOL_SIZE = int(os.getenv("MICROSERVICE_POOL_SIZE", 20))
+MICROSERVICE_CIRCUIT_THRESHOLD = int(os.getenv("MICROSERVICE_CIRCUIT_THRESHOLD", 5))
+MICROSERVICE_CIRCUIT_RESET = float(os.getenv("MICROSERVICE_CIRCUIT_RESET", 30))
+# Icons are downloaded and resized on a miss, give them longer
+MICROSERVICE_ICON_READ_TIMEOUT = float(os.getenv("MICROSERVICE_ICON_READ_TIMEOUT", 30))
+
+# Process-local price cache in front of Redis
+PRICE_L1_TTL = float(os.getenv("PRICE_L1_TTL", 5))
+PRICE_L1_MAX_SIZE = int(os.getenv("PRICE_L1_MAX_SIZE", 512))
+# How often a worker checks the versions of its local prices and flushes its hit counters
+PRICE_VERSION_CHECK_INTERVAL = float(os.getenv("PRICE_VERSION_CHECK_INTERVAL", 1))
+
+# The warm_prices worker refreshes open box prices this often, give or take the jitter,
+# so they are replaced before PRICE_CACHE_TIMEOUT expires them
+PRICE_WARM_INTERVAL = float(os.getenv("PRICE_WARM_INTERVAL", PRICE_CACHE_TIMEOUT * 0.75))
+PRICE_WARM_JITTER = float(os.getenv("PRICE_WARM_JITTER", 5))
+
+# Bulk CSV import of transactions
+TRANSACTION_IMPORT_MAX_ROWS = int(os.getenv("TRANSACTION_IMPORT_MAX_ROWS", 20000))
+TRANSACTION_IMPORT_BATCH_SIZE = int(os.getenv("TRANSACTION_IMPORT_BATCH_SIZE", 1000))
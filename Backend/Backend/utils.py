@@ -1,4 +1,6 @@
+from django.http import JsonResponse
 from rest_framework.response import Response
+from rest_framework.utils.encoders import JSONEncoder
 
 def create_response(success: bool, status,
                     data = None, message: str = ''):
@@ -18,3 +20,17 @@ def create_response(success: bool, status,
         'data': data,
     }
     return Response(response, status=status)
+
+
+def create_json_response(success: bool, status,
+                         data = None, message: str = ''):
+    """
+    create_response for plain Django views, such as the async ones, which DRF does not render.
+    The body is encoded like DRF's JSONRenderer, so both kinds of views return the same JSON.
+    """
+    response = {
+        'success': success,
+        'message': message,
+        'data': data,
+    }
+    return JsonResponse(response, status=status, encoder=JSONEncoder)
@@ -1,8 +1,23 @@
 from django.contrib import admin
 from .models import Box, Balance, BalanceHistory, Transaction, Coin
 
+
+@admin.register(Transaction)
+class TransactionAdmin(admin.ModelAdmin):
+    """Read only, trades go through portfolio.ledger so their box and balance stay in sync."""
+    list_display = ("user", "box", "type", "price", "amount", "value", "transaction_date")
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
 admin.site.register(Box)
 admin.site.register(Balance)
 admin.site.register(BalanceHistory)
-admin.site.register(Transaction)
 admin.site.register(Coin)
@@ -0,0 +1,130 @@
+"""
+Bulk import of transactions from a CSV file, with the columns
+coin_symbol, type, price, amount, fee (optional, percent) and transaction_date.
+
+Every row is applied in date order with the ledger's trade math against the user's boxes and
+balance held in memory, then everything is written with a handful of bulk queries in one
+transaction. Rows that can't be applied are skipped and reported with their row number,
+a file over TRANSACTION_IMPORT_MAX_ROWS is rejected as a whole.
+"""
+import csv
+import io
+import logging
+
+from django.conf import settings
+from django.db import transaction as db_transaction
+from rest_framework.exceptions import ValidationError
+
+from Backend.messages import serializer_response_message as mst
+from .ledger import BOX_TOTALS, apply_trade, snapshot
+from .models import Balance, BalanceHistory, Box, Coin, Transaction
+from .serializers.transaction_serializers import TransactionImportRowSerializer
+from .utils import fetch_coin_icons, validate_coins
+
+logger = logging.getLogger("backend")
+
+
+def read_rows(file):
+    """
+    Parse the uploaded CSV row by row, returning the valid rows and the errors of the others.
+    Raises ValidationError if the file is not a UTF-8 CSV or has more than TRANSACTION_IMPORT_MAX_ROWS rows.
+    """
+    rows, errors = [], []
+    # One serializer validates every row, building its fields per row would cost more than the validation
+    row_serializer = TransactionImportRowSerializer()
+    reader = csv.DictReader(io.TextIOWrapper(file, encoding="utf-8-sig", newline=""))
+
+    try:
+        for number, row in enumerate(reader, start=2):  # Row 1 is the header
+            if number - 1 > settings.TRANSACTION_IMPORT_MAX_ROWS:
+                # Nothing is written yet, the whole file is rejected rather than imported in part
+                raise ValidationError({"file": [mst[15].format(settings.TRANSACTION_IMPORT_MAX_ROWS)]})
+
+            # Empty cells count as missing, so optional columns fall back to their default
+            values = {key.strip(): value.strip() for key, value in row.items() if key and value and value.strip()}
+            try:
+                rows.append((number, row_serializer.run_validation(values)))
+            except ValidationError as e:
+                errors.append({"row": number, "errors": e.detail})
+    except (UnicodeDecodeError, csv.Error) as e:
+        logger.info(f"unreadable transactions file: {e}")
+        raise ValidationError({"file": [mst[17]]})
+
+    return rows, errors
+
+
+def _coins(symbols):
+    """Coin of every symbol the microservice knows, created if it is new, and the errors of the others."""
+    coins = {coin.symbol: coin for coin in Coin.objects.filter(symbol__in=symbols)}
+    unknown = [symbol for symbol in symbols if symbol not in coins]
+
+    names, errors = {}, {}
+    for symbol, (success, result) in (validate_coins(unknown).items() if unknown else ()):
+        if success:
+            names[symbol] = result
+        else:
+            errors[symbol] = result
+
+    if names:
+        # One /coin_icons call for every new coin, bulk_create skips Coin.save and its icon fetch per coin.
+        # A coin whose icon failed is created without one rather than failing the import.
+        icons = fetch_coin_icons(list(names))
+        Coin.objects.bulk_create([Coin(symbol=symbol, name=name, icon_url=icons.get(symbol))
+                                  for symbol, name in names.items()], ignore_conflicts=True)
+        for coin in Coin.objects.filter(symbol__in=names):
+            coins[coin.symbol] = coin
+        logger.info(f"new coins created: {', '.join(names)}")
+    return coins, errors
+
+
+def import_transactions(user, file):
+    """Import the transactions of a CSV file for the user, returning the import report."""
+    rows, errors = read_rows(file)
+    coins, coin_errors = _coins(sorted({data["coin_symbol"] for _, data in rows}))
+    rows.sort(key=lambda row: (row[1]["transaction_date"], row[0]))
+
+    with db_transaction.atomic():
+        balance = Balance.objects.select_for_update().get(user=user)
+        boxes = {box.coin.symbol: box for box in Box.objects.select_for_update(of=("self",))
+                 .select_related("coin").filter(user=user, is_closed=False)}
+
+        transactions, history, touched = [], [], {}
+        for number, data in rows:
+            symbol = data["coin_symbol"]
+            if symbol not in coins:
+                errors.append({"row": number, "errors": {"coin_symbol": [coin_errors.get(symbol, mst[9])]}})
+                continue
+
+            box = boxes.get(symbol)
+            if box is None:
+                box = Box(user=user, coin=coins[symbol])
+
+            transaction = Transaction(user=user, box=box, type=data["type"], price=data["price"],
+                                      fee=data["fee"], transaction_date=data["transaction_date"])
+            try:
+                apply_trade(box, balance, transaction, data["amount"])
+            except ValueError as e:
+                message, detail = e.args
+                errors.append({"row": number, "errors": {"non_field_errors": [message]}, "data": detail})
+                continue
+
+            boxes[symbol] = box
+            touched[symbol] = box
+            transactions.append(transaction)
+            history.append(snapshot(balance, user))
+
+        if transactions:
+            new_boxes = [box for box in touched.values() if box.pk is None]
+            Box.objects.bulk_update([box for box in touched.values() if box.pk is not None],
+                                    [*BOX_TOTALS, "average_buy_price", "average_sell_price"])
+            Box.objects.bulk_create(new_boxes)
+            Transaction.objects.bulk_create(transactions, batch_size=settings.TRANSACTION_IMPORT_BATCH_SIZE)
+            BalanceHistory.objects.bulk_create(history, batch_size=settings.TRANSACTION_IMPORT_BATCH_SIZE)
+            balance.save(update_fields=["usdt_balance", "coin_balance_at_cost"])
+
+    logger.info(f"user: {user}, imported {len(transactions)} transactions, {len(errors)} rows failed")
+    return {
+        "imported": len(transactions),
+        "failed": len(errors),
+        "errors": sorted(errors, key=lambda error: error["row"]),
+    }
@@ -0,0 +1,197 @@
+"""
+The single write path of trades. A trade locks its box and the user's balance, updates each
+with one UPDATE of F() expressions and keeps Balance.coin_balance_at_cost current, so a buy or
+sell costs six statements and concurrent trades of the same user queue up instead of
+overwriting each other.
+"""
+import logging
+from decimal import Decimal, ROUND_HALF_UP
+
+from django.db import transaction as db_transaction
+from django.db.models import F, Subquery
+
+from Backend.messages import serializer_response_message as mst
+from .models import Balance, BalanceHistory, Box, Transaction
+
+logger = logging.getLogger("backend")
+
+# Every amount column has 8 decimal places, rounding up front keeps our sums equal to the stored ones
+PLACES = Decimal("0.00000001")
+
+BOX_TOTALS = ("total_amount", "total_buy_amount", "total_sell_amount", "total_buy_value", "total_sell_value")
+BALANCE_TOTALS = ("usdt_balance", "coin_balance_at_cost")
+
+
+def quantize(value):
+    return Decimal(value).quantize(PLACES, rounding=ROUND_HALF_UP)
+
+
+def fee_multiplier(fee):
+    return Decimal("1") - fee / Decimal("100")
+
+
+def _lock(box_id):
+    """
+    Read the box and its owner's balance, locking both rows until the transaction ends.
+    The balance is locked first, the same order as the importer, so the two can't deadlock.
+    """
+    balance = Balance.objects.select_for_update().get(
+        user_id=Subquery(Box.objects.filter(pk=box_id).values("user_id")))
+    box = Box.objects.select_for_update(of=("self",)).get(pk=box_id)
+    return box, balance
+
+
+def _cost(amount, average_buy_price):
+    """What an open box adds to Balance.coin_balance_at_cost."""
+    return quantize(amount * average_buy_price)
+
+
+def apply_trade(box, balance, transaction, amount):
+    """
+    Apply a buy or sell to the in-memory box and balance and fill in the transaction.
+    A buy takes value (amount * price) from the balance and puts amount minus the fee in the box,
+    a sell credits value minus the fee. Raises ValueError(message, data) if it can't be applied.
+    """
+    price, fee = transaction.price, transaction.fee
+    cost_before = _cost(box.total_amount, box.average_buy_price)
+
+    if transaction.type == "buy":
+        value = quantize(amount * price)
+        if balance.usdt_balance < value:
+            raise ValueError(mst[4], {"balance": balance.usdt_balance, "value": value})
+
+        transaction.amount = quantize(amount * fee_multiplier(fee))
+        transaction.value = quantize(transaction.amount * price)
+        balance.usdt_balance -= value
+
+        box.total_amount += transaction.amount
+        box.total_buy_value += transaction.value
+        box.total_buy_amount += transaction.amount
+        box.average_buy_price = quantize(box.total_buy_value / box.total_buy_amount)
+    else:
+        transaction.amount = quantize(amount)
+        transaction.value = quantize(transaction.amount * price)
+        if box.total_amount < transaction.amount:
+            raise ValueError(mst[5], {"balance": box.total_amount, "value": transaction.value})
+
+        balance.usdt_balance += quantize(transaction.value * fee_multiplier(fee))
+        if box.average_buy_price:
+            transaction.profit_loss_percentage = quantize(
+                (price - box.average_buy_price) / box.average_buy_price * 100)
+            transaction.profit_loss_value = quantize(transaction.profit_loss_percentage / 100 * transaction.value)
+
+        box.total_amount -= transaction.amount
+        box.total_sell_value += transaction.value
+        box.total_sell_amount += transaction.amount
+        box.average_sell_price = quantize(box.total_sell_value / box.total_sell_amount)
+
+    balance.coin_balance_at_cost += _cost(box.total_amount, box.average_buy_price) - cost_before
+
+
+def replay_trade(box, transaction):
+    """Apply a saved transaction to the in-memory box totals, the way apply_trade did when it was recorded."""
+    if transaction.type == "buy":
+        box.total_amount += transaction.amount
+        box.total_buy_value += transaction.value
+        box.total_buy_amount += transaction.amount
+        if box.total_buy_amount:
+            box.average_buy_price = quantize(box.total_buy_value / box.total_buy_amount)
+    else:
+        box.total_amount -= transaction.amount
+        box.total_sell_value += transaction.value
+        box.total_sell_amount += transaction.amount
+        if box.total_sell_amount:
+            box.average_sell_price = quantize(box.total_sell_value / box.total_sell_amount)
+
+
+def cost_at_buy_price(boxes):
+    """Balance.coin_balance_at_cost of a user with the given open boxes."""
+    return sum((_cost(box.total_amount, box.average_buy_price) for box in boxes), Decimal("0"))
+
+
+def snapshot(balance, user):
+    """The BalanceHistory row recording the balance after a trade."""
+    return BalanceHistory(
+        user=user,
+        usdt_balance=balance.usdt_balance,
+        coin_balance=balance.coin_balance_at_cost,
+        total_balance=balance.usdt_balance + balance.coin_balance_at_cost,
+    )
+
+
+def _changes(instance, before, fields):
+    """F() increments moving each field of the row from its before value to the instance's value."""
+    return {field: F(field) + (getattr(instance, field) - before[field]) for field in fields}
+
+
+def record_transaction(user, box, type, price, amount, fee, transaction_date):
+    """Apply a buy or sell with apply_trade, save it and snapshot the balance."""
+    with db_transaction.atomic():
+        box, balance = _lock(box.pk)
+        box_before = {field: getattr(box, field) for field in BOX_TOTALS}
+        balance_before = {field: getattr(balance, field) for field in BALANCE_TOTALS}
+
+        transaction = Transaction(user=user, box=box, type=type, price=price, fee=fee,
+                                  transaction_date=transaction_date)
+        apply_trade(box, balance, transaction, amount)
+
+        Box.objects.filter(pk=box.pk).update(**_changes(box, box_before, BOX_TOTALS),
+                                             average_buy_price=box.average_buy_price,
+                                             average_sell_price=box.average_sell_price)
+        Balance.objects.filter(pk=balance.pk).update(**_changes(balance, balance_before, BALANCE_TOTALS))
+        transaction.save()
+        snapshot(balance, user).save()
+
+    return transaction
+
+
+def revert_transaction(transaction):
+    """
+    Undo the latest transaction of an open box and delete it, the box goes too once it is empty.
+    Raises ValueError(message, data) if the balance can't cover a reverted sell.
+    """
+    with db_transaction.atomic():
+        box, balance = _lock(transaction.box_id)
+        cost_before = _cost(box.total_amount, box.average_buy_price)
+
+        if transaction.type == "buy":
+            # The buy took the value before the fee was taken off the amount
+            usdt_change = quantize(transaction.amount / fee_multiplier(transaction.fee) * transaction.price)
+
+            box.total_amount -= transaction.amount
+            box.total_buy_value -= transaction.value
+            box.total_buy_amount -= transaction.amount
+            box.average_buy_price = (quantize(box.total_buy_value / box.total_buy_amount)
+                                     if box.total_buy_amount > 0 else Decimal("0"))
+            box_changes = {
+                "total_amount": F("total_amount") - transaction.amount,
+                "total_buy_value": F("total_buy_value") - transaction.value,
+                "total_buy_amount": F("total_buy_amount") - transaction.amount,
+                "average_buy_price": box.average_buy_price,
+            }
+        else:
+            usdt_change = -quantize(transaction.value * fee_multiplier(transaction.fee))
+            if balance.usdt_balance < -usdt_change:
+                raise ValueError(mst[4], {"balance": balance.usdt_balance, "value": -usdt_change})
+
+            box.total_amount += transaction.amount
+            box.total_sell_value -= transaction.value
+            box.total_sell_amount -= transaction.amount
+            box.average_sell_price = (quantize(box.total_sell_value / box.total_sell_amount)
+                                      if box.total_sell_amount > 0 else Decimal("0"))
+            box_changes = {
+                "total_amount": F("total_amount") + transaction.amount,
+                "total_sell_value": F("total_sell_value") - transaction.value,
+                "total_sell_amount": F("total_sell_amount") - transaction.amount,
+                "average_sell_price": box.average_sell_price,
+            }
+
+        cost_change = _cost(box.total_amount, box.average_buy_price) - cost_before
+        Balance.objects.filter(pk=balance.pk).update(usdt_balance=F("usdt_balance") + usdt_change,
+                                                     coin_balance_at_cost=F("coin_balance_at_cost") + cost_change)
+        transaction.delete()
+
+        if box.transactions.exists():
+            Box.objects.filter(pk=box.pk).update(**box_changes)
+        else:
+            box.delete()
@@ -0,0 +1,61 @@
+import json
+import time
+from decimal import Decimal
+
+import msgpack
+from django.core.management.base import BaseCommand, CommandError
+
+from Backend.http_client import microservice
+
+FORMATS = {
+    # Previous path: JSON floats turned into Decimal, keeping the binary float noise
+    "json-float": ("application/json", lambda body: {
+        symbol: Decimal(value[1]) for symbol, value in json.loads(body)["data"].items() if value[0]}),
+    "json-decimal": ("application/json", lambda body: {
+        symbol: Decimal(value[1]) for symbol, value in json.loads(body, parse_float=Decimal)["data"].items()
+        if value[0]}),
+    "msgpack": ("application/msgpack", lambda body: {
+        symbol: Decimal(value[1]) for symbol, value in msgpack.unpackb(body)["data"].items() if value[0]}),
+}
+
+
+class Command(BaseCommand):
+    help = "Compare payload size and decode time of the /multiple_prices response formats."
+
+    def add_arguments(self, parser):
+        parser.add_argument("symbols", help="Comma separated coin symbols to request")
+        parser.add_argument("--rounds", type=int, default=200, help="Requests per format")
+
+    def handle(self, *args, **options):
+        symbols = [symbol.strip() for symbol in options["symbols"].split(",") if symbol.strip()]
+        rounds = options["rounds"]
+
+        results = {}
+        for name, (accept, decode) in FORMATS.items():
+            request_seconds = decode_seconds = 0.0
+            size = 0
+            for _ in range(rounds):
+                started = time.perf_counter()
+                response = microservice.get("/multiple_prices", params={"coin_symbols": symbols},
+                                            headers={"Accept": accept})
+                body = response.content
+                decoded_at = time.perf_counter()
+                prices = decode(body)
+                finished = time.perf_counter()
+
+                request_seconds += finished - started
+                decode_seconds += finished - decoded_at
+                size = len(body)
+
+            if not response.headers.get("Content-Type", "").startswith(accept):
+                raise CommandError(f"Asked for {accept} but got {response.headers.get('Content-Type')}")
+            results[name] = prices
+            self.stdout.write(
+                f"{name:<13} {size:>7} bytes  decode {decode_seconds / rounds * 1e6:9.1f} us  "
+                f"end to end {request_seconds / rounds * 1e3:8.2f} ms"
+            )
+
+        # Decimal(float) spells out the binary value, more digits than a double holds is noise
+        noisy = [symbol for symbol, price in results["json-float"].items()
+                 if len(price.as_tuple().digits) > 17]
+        self.stdout.write(f"{len(noisy)}/{len(symbols)} prices carry float noise on the json-float path")
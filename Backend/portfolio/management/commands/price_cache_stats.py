@@ -0,0 +1,43 @@
+from django.core.management.base import BaseCommand
+
+from portfolio import price_cache
+
+
+class Command(BaseCommand):
+    help = ("Show how many price lookups every worker answered from process memory, from Redis and from neither, "
+            "and how the microservice calls behind the misses went.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--reset", action="store_true", help="Clear the counters after printing them")
+
+    def handle(self, *args, **options):
+        self.show_hit_ratios()
+        self.show_microservice_stats()
+
+        if options["reset"]:
+            price_cache.reset_stats()
+
+    def show_hit_ratios(self):
+        stats = price_cache.hit_ratios()
+        if not stats["lookups"]:
+            self.stdout.write("No price lookups recorded yet.")
+            return
+
+        self.stdout.write(f"lookups   {stats['lookups']}")
+        self.stdout.write(f"L1 hits   {stats.get('l1_hits', 0):<10} ratio {stats['l1_hit_ratio']:.1%}")
+        l2_ratio = f"{stats['l2_hit_ratio']:.1%}" if stats["l2_hit_ratio"] is not None else "-"
+        self.stdout.write(f"L2 hits   {stats.get('l2_hits', 0):<10} ratio {l2_ratio} of L1 misses")
+        self.stdout.write(f"misses    {stats.get('misses', 0)}")
+
+    def show_microservice_stats(self):
+        stats = price_cache.microservice_stats()
+        if not stats["endpoints"] and not stats["circuit_rejected"]:
+            self.stdout.write("No microservice calls recorded yet.")
+            return
+
+        self.stdout.write("")
+        self.stdout.write(f"{'endpoint':<20} {'calls':>8} {'errors':>8} {'mean ms':>10}")
+        for endpoint, endpoint_stats in sorted(stats["endpoints"].items()):
+            mean = f"{endpoint_stats['mean_ms']:.1f}" if endpoint_stats["mean_ms"] is not None else "-"
+            self.stdout.write(f"{endpoint:<20} {endpoint_stats['calls']:>8} {endpoint_stats['errors']:>8} {mean:>10}")
+        self.stdout.write(f"circuit opened {stats['circuit_opened']} times, rejected {stats['circuit_rejected']} calls")
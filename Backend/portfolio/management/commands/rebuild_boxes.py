@@ -0,0 +1,122 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from decimal import Decimal
+
+import django
+from django.core.management.base import BaseCommand
+from django.db import connections, transaction as db_transaction
+
+from portfolio.ledger import BOX_TOTALS, cost_at_buy_price, replay_trade, snapshot
+from portfolio.models import Balance, Box, Transaction
+
+BOX_FIELDS = (*BOX_TOTALS, "average_buy_price", "average_sell_price")
+
+
+def _start_worker():
+    """Each worker opens its own database connections, the ones inherited from the parent can't be shared."""
+    django.setup()
+    connections.close_all()
+
+
+def replayed_boxes(user_id, chunk_size):
+    """Box id -> the box totals replayed from its transactions in date order, streamed in chunks."""
+    replayed = {}
+    transactions = (Transaction.objects.filter(user_id=user_id)
+                    .order_by("box_id", "transaction_date", "id")
+                    .only("box_id", "type", "amount", "value")
+                    .iterator(chunk_size=chunk_size))
+    for transaction in transactions:
+        box = replayed.get(transaction.box_id)
+        if box is None:
+            box = replayed[transaction.box_id] = Box(**{field: Decimal("0") for field in BOX_FIELDS})
+        replay_trade(box, transaction)
+    return replayed
+
+
+def rebuild_user(user_id, repair, chunk_size):
+    """Compare the user's boxes and coin_balance_at_cost with a replay of the transactions, fixing them on repair."""
+    with db_transaction.atomic():
+        boxes = Box.objects.filter(user_id=user_id).order_by("id")
+        balance = Balance.objects.filter(user_id=user_id).select_related("user")
+        if repair:  # Trades of this user wait until the repair is written
+            balance, boxes = balance.select_for_update(), boxes.select_for_update()
+        balance = balance.first()
+        boxes = list(boxes)
+
+        replayed = replayed_boxes(user_id, chunk_size)
+        differences, drifted = [], []
+        for box in boxes:
+            expected = replayed.get(box.pk) or Box(**{field: Decimal("0") for field in BOX_FIELDS})
+            changed = [(field, getattr(box, field), getattr(expected, field)) for field in BOX_FIELDS
+                       if getattr(box, field) != getattr(expected, field)]
+            if changed:
+                differences += [{"user": user_id, "box": box.pk, "field": field, "stored": stored, "replayed": value}
+                                for field, stored, value in changed]
+                for field, _, value in changed:
+                    setattr(box, field, value)
+                drifted.append(box)
+
+        cost = cost_at_buy_price([box for box in boxes if not box.is_closed])
+        balance_drifted = balance is not None and balance.coin_balance_at_cost != cost
+        if balance_drifted:
+            differences.append({"user": user_id, "box": None, "field": "coin_balance_at_cost",
+                                "stored": balance.coin_balance_at_cost, "replayed": cost})
+
+        if repair and (drifted or balance_drifted):
+            Box.objects.bulk_update(drifted, BOX_FIELDS)
+            if balance is not None:
+                balance.coin_balance_at_cost = cost
+                balance.save(update_fields=["coin_balance_at_cost"])
+                # The usdt side has no ledger of deposits to replay, the fresh snapshot carries the corrected cost
+                snapshot(balance, balance.user).save()
+
+    return len(boxes), len(drifted), balance_drifted, differences
+
+
+def rebuild_shard(user_ids, repair, chunk_size):
+    totals = {"users": 0, "boxes": 0, "drifted_boxes": 0, "drifted_balances": 0}
+    differences = []
+    for user_id in user_ids:
+        boxes, drifted, balance_drifted, user_differences = rebuild_user(user_id, repair, chunk_size)
+        totals["users"] += 1
+        totals["boxes"] += boxes
+        totals["drifted_boxes"] += drifted
+        totals["drifted_balances"] += balance_drifted
+        differences += user_differences
+    return totals, differences
+
+
+class Command(BaseCommand):
+    help = ("Replay every box's transactions in date order and compare the result with the stored box totals "
+            "and Balance.coin_balance_at_cost, fixing them with --repair. Users are sharded across a process pool.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--repair", action="store_true", help="Write the replayed values where they differ")
+        parser.add_argument("--workers", type=int, default=os.cpu_count(), help="Worker processes")
+        parser.add_argument("--shard-size", type=int, default=50, help="Users per task handed to a worker")
+        parser.add_argument("--chunk-size", type=int, default=2000, help="Transactions fetched per round-trip")
+        parser.add_argument("--user", type=int, action="append", dest="users", help="Only these user ids")
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        user_ids = options["users"] or list(Box.objects.order_by("user_id").values_list("user_id", flat=True)
+                                            .distinct().iterator(chunk_size=options["chunk_size"]))
+        shards = [user_ids[i:i + options["shard_size"]] for i in range(0, len(user_ids), options["shard_size"])]
+
+        totals = {"users": 0, "boxes": 0, "drifted_boxes": 0, "drifted_balances": 0}
+        connections.close_all()  # Forked workers must not share the parent's connections
+        with ProcessPoolExecutor(max_workers=options["workers"], initializer=_start_worker) as pool:
+            tasks = [pool.submit(rebuild_shard, shard, options["repair"], options["chunk_size"]) for shard in shards]
+            for task in as_completed(tasks):
+                shard_totals, differences = task.result()
+                for name, value in shard_totals.items():
+                    totals[name] += value
+                for difference in differences:
+                    self.stdout.write(f"user {difference['user']} box {difference['box']} {difference['field']}: "
+                                      f"stored {difference['stored']}, replayed {difference['replayed']}")
+
+        action = "repaired" if options["repair"] else "found"
+        self.stdout.write(f"Checked {totals['boxes']} boxes of {totals['users']} users in "
+                          f"{time.perf_counter() - started:.1f}s, {action} {totals['drifted_boxes']} drifted boxes "
+                          f"and {totals['drifted_balances']} drifted balances.")
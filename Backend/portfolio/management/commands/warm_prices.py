@@ -0,0 +1,40 @@
+import logging
+import random
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from portfolio.models import Coin
+from portfolio.utils import warm_prices
+
+logger = logging.getLogger("backend")
+
+
+class Command(BaseCommand):
+    help = "Refresh the cached prices of every coin held in an open box, once or periodically with --loop."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--loop", action="store_true",
+                            help="Keep warming every PRICE_WARM_INTERVAL seconds, with up to PRICE_WARM_JITTER of jitter")
+
+    def handle(self, *args, **options):
+        while True:
+            self.warm()
+            if not options["loop"]:
+                return
+            # Jitter keeps several warmers, or restarts, from hitting the microservice in lockstep
+            time.sleep(max(0.0, settings.PRICE_WARM_INTERVAL
+                           + random.uniform(-settings.PRICE_WARM_JITTER, settings.PRICE_WARM_JITTER)))
+
+    def warm(self):
+        started = time.perf_counter()
+        symbols = list(Coin.objects.filter(boxes__is_closed=False).values_list("symbol", flat=True).distinct())
+        try:
+            warmed = warm_prices(symbols) if symbols else {}
+        except Exception as e:  # The loop outlives Redis or microservice outages
+            logger.error(f"Warming prices failed: {e}")
+            return
+
+        logger.info(f"Warmed {len(warmed)} of {len(symbols)} open box symbols "
+                    f"in {(time.perf_counter() - started) * 1000:.0f}ms")
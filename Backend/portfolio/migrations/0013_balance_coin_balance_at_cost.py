@@ -0,0 +1,34 @@
+# Generated by Django 5.1.5 on 2026-10-18 10:00
+
+from django.db import migrations, models
+from django.db.models import DecimalField, ExpressionWrapper, F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce, Round
+
+
+def fill_coin_balance_at_cost(apps, schema_editor):
+    Balance = apps.get_model('portfolio', 'Balance')
+    Box = apps.get_model('portfolio', 'Box')
+
+    # Rounded per box to 8 places like ledger._cost, so the backfill equals what the ledger keeps
+    cost = Round(ExpressionWrapper(F('total_amount') * F('average_buy_price'),
+                                   output_field=DecimalField(max_digits=18, decimal_places=8)), 8)
+    open_boxes_cost = (Box.objects.filter(user=OuterRef('user'), is_closed=False)
+                       .values('user').annotate(cost=Sum(cost)).values('cost'))
+    Balance.objects.update(coin_balance_at_cost=Coalesce(Subquery(open_boxes_cost), Value(0),
+                                                         output_field=DecimalField(max_digits=18, decimal_places=8)))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('portfolio', '0012_alter_coin_icon_url'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='balance',
+            name='coin_balance_at_cost',
+            field=models.DecimalField(decimal_places=8, default=0, max_digits=18),
+        ),
+        migrations.RunPython(fill_coin_balance_at_cost, migrations.RunPython.noop),
+    ]
@@ -1,10 +1,8 @@
-from decimal import Decimal
-
 from django.contrib.auth.models import User
 from django.db import models
+from django.db.models import F
 from django.utils.timezone import now
 
-from Backend.messages import serializer_response_message as mst
 from .utils import fetch_coin_icon, fetch_multiple_prices
 
 
@@ -26,48 +24,47 @@ class Coin(models.Model):
 class Balance(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name="balance")
     usdt_balance = models.DecimalField(max_digits=18, decimal_places=8, default=0)
+    # Open box amounts at their average buy price, kept current by the ledger on every trade
+    coin_balance_at_cost = models.DecimalField(max_digits=18, decimal_places=8, default=0)
 
     def deposit(self, amount):
         """Increase USDT balance when adding USDT."""
-        self.usdt_balance += amount
-        self.save()
+        Balance.objects.filter(pk=self.pk).update(usdt_balance=F("usdt_balance") + amount)
+        self.refresh_from_db(fields=["usdt_balance"])
 
     def withdraw(self, amount):
-        """Decrease USDT balance when making a transaction."""
-        if self.usdt_balance >= amount:
-            self.usdt_balance -= amount
-            self.save()
-            return True
-        return False  # Insufficient funds
-
-    def get_coin_balance(self):
-        """Calculate total value of coins the user holds in USDT."""
-        boxes = Box.objects.filter(user=self.user, is_closed=False)
-        coin_symbols = list(set(box.coin.symbol for box in boxes))
-        coin_prices = fetch_multiple_prices(coin_symbols)
-
+        """Decrease USDT balance, in the same UPDATE that checks it covers the amount."""
+        withdrawn = Balance.objects.filter(pk=self.pk, usdt_balance__gte=amount) \
+            .update(usdt_balance=F("usdt_balance") - amount)
+        self.refresh_from_db(fields=["usdt_balance"])
+        return bool(withdrawn)  # Insufficient funds otherwise
+
+    def get_coin_balance(self, coin_prices=None):
+        """Calculate total value of coins the user holds in USDT, at the given prices if already fetched."""
+        boxes = Box.objects.filter(user=self.user, is_closed=False).select_related("coin")
+        if coin_prices is None:
+            coin_prices = fetch_multiple_prices(list(set(box.coin.symbol for box in boxes)))
+
+        return self.coin_balance_of(boxes, coin_prices)
+
+    @staticmethod
+    def coin_balance_of(open_boxes, coin_prices):
+        """Value in USDT of the given open boxes at the given prices."""
         coin_balance = 0
 
-        for box in boxes:
-            box_coin_balance = box.total_amount * coin_prices[box.coin.symbol]
+        for box in open_boxes:
+            box_coin_balance = box.total_amount * coin_prices.get(box.coin.symbol, 0)
             coin_balance += box_coin_balance
 
         return coin_balance
 
-    def get_total_balance(self):
+    def get_total_balance(self, coin_prices=None):
         """Total balance = USDT balance + Coin balance."""
-        return self.usdt_balance + self.get_coin_balance()
+        return self.usdt_balance + self.get_coin_balance(coin_prices)
 
     def get_coin_balance_at_buy_price(self):
-        """Calculate total value of all coins held based on their buy price."""
-
-        boxes = Box.objects.filter(user=self.user, is_closed=False)
-
-        total_coin_balance = 0
-        for box in boxes:
-            total_coin_balance += box.total_amount * box.average_buy_price
-
-        return total_coin_balance
+        """Total value of all coins held based on their buy price."""
+        return self.coin_balance_at_cost
 
     def __str__(self):
         return f"{self.user.username} - USDT: {self.usdt_balance}, Total: {self.get_total_balance()}"
@@ -118,6 +115,7 @@ class Box(models.Model):
 
 
 class Transaction(models.Model):
+    """A buy or sell, created through portfolio.ledger which applies it to its box and balance."""
     TYPE_CHOICES = [('buy', 'Buy'), ('sell', 'Sell')]
 
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="transactions")
@@ -131,55 +129,5 @@ class Transaction(models.Model):
     transaction_date = models.DateTimeField(default=now)
     fee = models.DecimalField(max_digits=18, decimal_places=8, default=0.02)
 
-    def save(self, *args, **kwargs):
-        """Handle buy/sell updates when saving the transaction."""
-
-        box = self.box
-        balance = self.user.balance
-
-        if self.type == 'buy':
-            if not balance.withdraw(self.value):
-                raise ValueError(mst[4])
-
-            self.amount *= (Decimal('1') - self.fee / Decimal('100'))
-            self.value = self.amount * self.price
-
-            box.total_amount += self.amount
-            box.total_buy_value += self.value
-            box.total_buy_amount += self.amount
-            box.save()
-
-            box.average_buy_price = box.total_buy_value / box.total_buy_amount
-            box.save()
-
-
-        elif self.type == 'sell':
-
-            box.total_amount -= self.amount
-            box.total_sell_value += self.value
-            box.total_sell_amount += self.amount
-
-            balance.deposit(self.value * (Decimal('1') - self.fee / Decimal('100')))
-
-            box.save()
-
-            box.average_sell_price = box.total_sell_value / box.total_sell_amount
-            box.save()
-
-            # Calculate profit/loss for the sell
-            self.profit_loss_percentage = ((self.price - box.average_buy_price) / box.average_buy_price) * 100
-            self.profit_loss_value = (self.profit_loss_percentage / 100) * self.value
-
-        total_coin_balance = balance.get_coin_balance_at_buy_price()
-
-        BalanceHistory.objects.create(
-            user=self.user,
-            usdt_balance=balance.usdt_balance,
-            coin_balance=total_coin_balance,
-            total_balance=balance.usdt_balance + total_coin_balance,
-        )
-
-        super().save(*args, **kwargs)
-
     def __str__(self):
         return f"{self.type.upper()} {self.amount} @ {self.price} ({self.box.coin.name})"
@@ -0,0 +1,413 @@
+import asyncio
+import threading
+import time
+import uuid
+import weakref
+from collections import OrderedDict
+from decimal import Decimal
+
+import redis
+import redis.asyncio
+from django.conf import settings
+
+from Backend.http_client import microservice
+
+# SET NX every lock key in one round-trip, returns 1 for each lock taken and 0 for each one held elsewhere
+ACQUIRE_LOCKS = """
+local acquired = {}
+for i, key in ipairs(KEYS) do
+    if redis.call('SET', key, ARGV[1], 'NX', 'EX', ARGV[2]) then
+        acquired[i] = 1
+    else
+        acquired[i] = 0
+    end
+end
+return acquired
+"""
+
+# Delete only the locks still holding our token, an expired lock may belong to another worker by now,
+# and tell the workers waiting for each released symbol that its fetch is over
+RELEASE_LOCKS = """
+local released = 0
+for i, key in ipairs(KEYS) do
+    if redis.call('GET', key) == ARGV[1] then
+        released = released + redis.call('DEL', key)
+        redis.call('PUBLISH', ARGV[i + 1], '1')
+    end
+end
+return released
+"""
+
+
+# Prefix of every key below, the Django cache keys of the same Redis never start with it
+KEY_PREFIX = "price_cache:"
+# Version of every symbol's price, bumped each time the symbol is written
+VERSIONS_KEY = "price_versions"
+# Hit counters of every worker, flushed together with the version check
+STATS_KEY = "price_cache_stats"
+# Microservice call counters of every worker, flushed alongside the hit counters
+MICROSERVICE_STATS_KEY = "microservice_stats"
+
+
+class LocalPriceCache:
+    """
+    Process-local LRU of prices in front of Redis, entries live PRICE_L1_TTL seconds.
+    Each entry keeps the version its price was read under, and every worker compares them
+    with the shared versions at most once per PRICE_VERSION_CHECK_INTERVAL, dropping
+    only the symbols written since. A refresh of some symbols leaves the others cached.
+    """
+
+    def __init__(self, max_size, ttl):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.checked_at = 0.0
+        self.counts = {"l1_hits": 0, "l2_hits": 0, "misses": 0}
+        self._lock = threading.Lock()
+
+    def get_many(self, symbols):
+        now = time.monotonic()
+        prices = {}
+        with self._lock:
+            for symbol in symbols:
+                entry = self.entries.get(symbol)
+                if entry and entry[2] > now:
+                    self.entries.move_to_end(symbol)
+                    prices[symbol] = entry[0]
+        return prices
+
+    def set_many(self, prices, versions):
+        """Store prices with the versions they were read under, a price older than ours is not stored."""
+        expires_at = time.monotonic() + self.ttl
+        with self._lock:
+            for symbol, price in prices.items():
+                version = versions.get(symbol, 0)
+                entry = self.entries.get(symbol)
+                if entry and entry[1] > version:
+                    continue
+                self.entries[symbol] = (price, version, expires_at)
+                self.entries.move_to_end(symbol)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+    def symbols(self):
+        with self._lock:
+            return list(self.entries)
+
+    def use_versions(self, versions):
+        """Drop the local prices of the symbols written by another worker since we read them."""
+        with self._lock:
+            for symbol, version in versions.items():
+                entry = self.entries.get(symbol)
+                if entry and entry[1] != version:
+                    del self.entries[symbol]
+
+    def count(self, l1_hits=0, l2_hits=0, misses=0):
+        with self._lock:
+            self.counts["l1_hits"] += l1_hits
+            self.counts["l2_hits"] += l2_hits
+            self.counts["misses"] += misses
+
+    def take_counts(self):
+        """The hit counters to flush if the versions are due for a check, None otherwise."""
+        now = time.monotonic()
+        with self._lock:
+            if now - self.checked_at < settings.PRICE_VERSION_CHECK_INTERVAL:
+                return None
+            self.checked_at = now
+            counts, self.counts = self.counts, {"l1_hits": 0, "l2_hits": 0, "misses": 0}
+        return counts
+
+
+local_prices = LocalPriceCache(settings.PRICE_L1_MAX_SIZE, settings.PRICE_L1_TTL)
+
+
+def key(name):
+    """Our keys live next to the Django cache in the same Redis, under a prefix of their own."""
+    return f"{KEY_PREFIX}{name}"
+
+
+def price_key(symbol):
+    return key(f"price:{symbol}")
+
+
+def lock_key(symbol):
+    return key(f"fetch_lock:{symbol}")
+
+
+def ready_channel(symbol):
+    return key(f"ready:{symbol}")
+
+
+def dumps(price):
+    """Prices are stored as exact decimal strings."""
+    return str(price)
+
+
+def loads(value):
+    return Decimal(value.decode())
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def _redis():
+    """Our own client of the cache's Redis, its connection pool is shared by every thread of the process."""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = redis.Redis.from_url(settings.CACHES["default"]["LOCATION"])
+    return _client
+
+
+_async_clients = weakref.WeakKeyDictionary()
+
+
+def _aredis():
+    """Async client of the cache's Redis, one per event loop since its connections belong to the loop."""
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None:
+        client = redis.asyncio.Redis.from_url(settings.CACHES["default"]["LOCATION"])
+        _async_clients[loop] = client
+    return client
+
+
+def _version_check(client):
+    """
+    A pipeline reading the versions of our local prices and flushing our hit and
+    microservice counters, with the symbols it reads. None if they were checked recently.
+    """
+    counts = local_prices.take_counts()
+    if counts is None:
+        return None, []
+    symbols = local_prices.symbols()
+    pipeline = client.pipeline(transaction=False)
+    if symbols:
+        pipeline.hmget(key(VERSIONS_KEY), symbols)
+    for name, value in counts.items():
+        if value:
+            pipeline.hincrby(key(STATS_KEY), name, value)
+    for name, value in microservice.take_stats().items():
+        pipeline.hincrbyfloat(key(MICROSERVICE_STATS_KEY), name, value)
+    return pipeline, symbols
+
+
+def _use_versions(symbols, results):
+    if symbols:
+        local_prices.use_versions({symbol: int(version or 0) for symbol, version in zip(symbols, results[0])})
+
+
+def _price_reads(client, symbols):
+    """
+    A pipeline reading the versions of the given symbols, then their prices. A write landing
+    in between leaves a newer price under an older version, which the next check drops.
+    """
+    pipeline = client.pipeline(transaction=False)
+    pipeline.hmget(key(VERSIONS_KEY), symbols)
+    pipeline.mget([price_key(symbol) for symbol in symbols])
+    return pipeline
+
+
+def _local_read(symbols):
+    prices = local_prices.get_many(symbols)
+    return prices, [symbol for symbol in symbols if symbol not in prices]
+
+
+def _remote_read(symbols, prices, missing, results):
+    """Keep the prices Redis returned for the local misses, and count where each lookup was answered."""
+    found, versions = {}, {}
+    if missing:
+        for symbol, version, value in zip(missing, *results):
+            if value is not None:
+                found[symbol] = loads(value)
+                versions[symbol] = int(version or 0)
+    local_prices.set_many(found, versions)
+    prices.update(found)
+    local_prices.count(l1_hits=len(symbols) - len(missing), l2_hits=len(found), misses=len(missing) - len(found))
+    return prices
+
+
+def get_prices(symbols):
+    """
+    Read the cached prices of the given symbols, from process memory first and the rest
+    from Redis in a single round-trip that also reads the versions they belong to.
+    """
+    pipeline, checked = _version_check(_redis())
+    if pipeline is not None:
+        _use_versions(checked, pipeline.execute())
+
+    prices, missing = _local_read(symbols)
+    results = _price_reads(_redis(), missing).execute() if missing else None
+    return _remote_read(symbols, prices, missing, results)
+
+
+async def aget_prices(symbols):
+    """Async get_prices, on the event loop's own Redis connection."""
+    client = _aredis()
+    pipeline, checked = _version_check(client)
+    if pipeline is not None:
+        _use_versions(checked, await pipeline.execute())
+
+    prices, missing = _local_read(symbols)
+    results = await _price_reads(client, missing).execute() if missing else None
+    return _remote_read(symbols, prices, missing, results)
+
+
+def _price_writes(client, prices):
+    """
+    A pipeline storing each price under its own key, so every symbol expires on its own,
+    then bumping the version of each symbol written.
+    """
+    pipeline = client.pipeline(transaction=False)
+    for symbol, price in prices.items():
+        pipeline.set(price_key(symbol), dumps(price), ex=settings.PRICE_CACHE_TIMEOUT)
+    for symbol in prices:
+        pipeline.hincrby(key(VERSIONS_KEY), symbol, 1)
+    return pipeline
+
+
+def _written_versions(prices, results):
+    return dict(zip(prices, results[len(prices):]))
+
+
+def set_prices(prices):
+    if prices:
+        local_prices.set_many(prices, _written_versions(prices, _price_writes(_redis(), prices).execute()))
+
+
+async def aset_prices(prices):
+    if prices:
+        local_prices.set_many(prices, _written_versions(prices, await _price_writes(_aredis(), prices).execute()))
+
+
+def hit_ratios():
+    """Share of price lookups answered by process memory and by Redis, summed over every worker."""
+    counts = {name.decode(): int(value)
+              for name, value in _redis().hgetall(key(STATS_KEY)).items()}
+    lookups = sum(counts.get(name, 0) for name in ("l1_hits", "l2_hits", "misses"))
+    l2_lookups = lookups - counts.get("l1_hits", 0)
+    return {
+        **counts,
+        "lookups": lookups,
+        "l1_hit_ratio": counts.get("l1_hits", 0) / lookups if lookups else None,
+        "l2_hit_ratio": counts.get("l2_hits", 0) / l2_lookups if l2_lookups else None,
+    }
+
+
+def microservice_stats():
+    """Calls, errors and mean latency per microservice endpoint, and the circuit breaker counts, over every worker."""
+    counts = {name.decode(): float(value)
+              for name, value in _redis().hgetall(key(MICROSERVICE_STATS_KEY)).items()}
+    endpoints = {}
+    for name, value in counts.items():
+        endpoint, _, field = name.rpartition(":")
+        if endpoint:
+            endpoints.setdefault(endpoint, {"calls": 0, "errors": 0, "seconds": 0.0})[field] = \
+                value if field == "seconds" else int(value)
+    for stats in endpoints.values():
+        stats["mean_ms"] = stats["seconds"] / stats["calls"] * 1000 if stats["calls"] else None
+    return {
+        "endpoints": endpoints,
+        "circuit_opened": int(counts.get("circuit_opened", 0)),
+        "circuit_rejected": int(counts.get("circuit_rejected", 0)),
+    }
+
+
+def reset_stats():
+    _redis().delete(key(STATS_KEY), key(MICROSERVICE_STATS_KEY))
+
+
+def acquire_locks(symbols):
+    """Try to take the fetch lock of every symbol at once, return our token and the symbols we locked."""
+    token = uuid.uuid4().hex
+    acquire = _redis().register_script(ACQUIRE_LOCKS)
+    acquired = acquire(keys=[lock_key(symbol) for symbol in symbols], args=[token, settings.PRICE_LOCK_TIMEOUT])
+    return token, [symbol for symbol, taken in zip(symbols, acquired) if taken]
+
+
+async def aacquire_locks(symbols):
+    token = uuid.uuid4().hex
+    acquire = _aredis().register_script(ACQUIRE_LOCKS)
+    acquired = await acquire(keys=[lock_key(symbol) for symbol in symbols],
+                             args=[token, settings.PRICE_LOCK_TIMEOUT])
+    return token, [symbol for symbol, taken in zip(symbols, acquired) if taken]
+
+
+def release_locks(symbols, token):
+    if symbols:
+        release = _redis().register_script(RELEASE_LOCKS)
+        release(keys=[lock_key(symbol) for symbol in symbols],
+                args=[token, *[ready_channel(symbol) for symbol in symbols]])
+
+
+async def arelease_locks(symbols, token):
+    if symbols:
+        release = _aredis().register_script(RELEASE_LOCKS)
+        await release(keys=[lock_key(symbol) for symbol in symbols],
+                      args=[token, *[ready_channel(symbol) for symbol in symbols]])
+
+
+def wait_for_prices(symbols, timeout):
+    """
+    Wait until the workers holding the locks of the given symbols finished fetching them,
+    and return the prices that arrived. Waiters block on a pub/sub message published when
+    a lock is released, so they wake as soon as the price is stored and poll nothing.
+    """
+    client = _redis()
+    pubsub = client.pubsub(ignore_subscribe_messages=True)
+    try:
+        channels = {ready_channel(symbol): symbol for symbol in symbols}
+        pubsub.subscribe(*channels)
+
+        # The fetch may have ended before we subscribed, its lock is gone by then
+        prices = get_prices(symbols)
+        locks = client.mget([lock_key(symbol) for symbol in symbols])
+        pending = {channel: symbol for (channel, symbol), lock in zip(channels.items(), locks)
+                   if symbol not in prices and lock is not None}
+
+        deadline = time.monotonic() + timeout
+        while pending:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            message = pubsub.get_message(timeout=remaining)
+            if message is None:
+                continue
+            symbol = pending.pop(message["channel"].decode(), None)
+            if symbol:
+                prices.update(get_prices([symbol]))
+        return prices
+    finally:
+        pubsub.close()
+
+
+async def await_for_prices(symbols, timeout):
+    """Async wait_for_prices, the waiting request holds no thread while it blocks."""
+    client = _aredis()
+    pubsub = client.pubsub(ignore_subscribe_messages=True)
+    try:
+        channels = {ready_channel(symbol): symbol for symbol in symbols}
+        await pubsub.subscribe(*channels)
+
+        prices = await aget_prices(symbols)
+        locks = await client.mget([lock_key(symbol) for symbol in symbols])
+        pending = {channel: symbol for (channel, symbol), lock in zip(channels.items(), locks)
+                   if symbol not in prices and lock is not None}
+
+        deadline = time.monotonic() + timeout
+        while pending:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            message = await pubsub.get_message(timeout=remaining)
+            if message is None:
+                continue
+            symbol = pending.pop(message["channel"].decode(), None)
+            if symbol:
+                prices.update(await aget_prices([symbol]))
+        return prices
+    finally:
+        await pubsub.aclose()
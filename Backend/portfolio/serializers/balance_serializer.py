@@ -18,11 +18,17 @@ class BalanceSerializer(serializers.ModelSerializer):
     def get_usdt_balance(self, obj):
         return self.format_decimal(obj.usdt_balance)
 
+    def coins_value(self, obj):
+        """The coin balance given in the context, or computed once for both fields."""
+        if "coin_balance" not in self.context:
+            self.context["coin_balance"] = obj.get_coin_balance(self.context.get("price_data"))
+        return self.context["coin_balance"]
+
     def get_coin_balance(self, obj):
-        return self.format_decimal(obj.get_coin_balance())
+        return self.format_decimal(self.coins_value(obj))
 
     def get_total_balance(self, obj):
-        return self.format_decimal(obj.get_total_balance())
+        return self.format_decimal(obj.usdt_balance + self.coins_value(obj))
 
     class Meta:
         model = Balance
@@ -3,9 +3,9 @@ from decimal import Decimal
 
 import requests
 from datetime import datetime
-from django.conf import settings
 from rest_framework import serializers
 
+from Backend.http_client import microservice
 from Backend.messages import response_message as mt
 from Backend.messages import serializer_response_message as smt
 from ..models import Box, Transaction, Balance, Coin
@@ -42,13 +42,12 @@ class TransactionSerializer(serializers.Serializer):
 
     def validate_coin(self, coin_symbol):
         """Calls the microservice to validate the coin symbol."""
-        url = f"{settings.FETCH_PRICE_MICRO_SERVICE}/validate_coin/{coin_symbol}"
+        path = f"/validate_coin/{coin_symbol}"
         try:
-            logger.debug(f"send request to fetch validation {url}")
-            response = requests.get(url, timeout=20)
-            response.raise_for_status()
+            logger.debug(f"send request to fetch validation {path}")
+            response = microservice.get(path)
             data = response.json()
-            logger.debug(f"response of validation request to {url}: {data}")
+            logger.debug(f"response of validation request to {path}: {data}")
             if not data["success"]:
                 raise serializers.ValidationError(
                     {"coin_symbol": data.get("data")}
@@ -62,7 +61,7 @@ class TransactionSerializer(serializers.Serializer):
 
             return coin_symbol.upper(), coin_name
         except requests.RequestException as e:
-            logger.error(f"went wrong on sending request: {e} to the {url}")
+            logger.error(f"went wrong on sending request: {e} to the {path}")
             raise requests.RequestException(mt[500])
 
     def validate(self, data):
@@ -145,4 +144,17 @@ class TransactionDataSerializer(serializers.ModelSerializer):
         elif obj.type == "sell":
             return obj.profit_loss_percentage
 
-        return None
\ No newline at end of file
+        return None
+
+class TransactionImportRowSerializer(serializers.Serializer):
+    """One row of a transaction CSV import, the coin is validated for the whole file at once."""
+    coin_symbol = serializers.CharField(max_length=10)
+    type = serializers.ChoiceField(choices=Transaction.TYPE_CHOICES)
+    price = serializers.DecimalField(max_digits=18, decimal_places=8, min_value=Decimal("0.00000001"))
+    amount = serializers.DecimalField(max_digits=18, decimal_places=8, min_value=Decimal("0.00000001"))
+    fee = serializers.DecimalField(max_digits=5, decimal_places=2, required=False, default=Decimal("0.02"),
+                                   min_value=Decimal("0"), max_value=Decimal("5"))
+    transaction_date = serializers.DateTimeField()
+
+    def validate_coin_symbol(self, value):
+        return value.strip().upper()
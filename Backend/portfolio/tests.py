@@ -1,3 +1,112 @@
-from django.test import TestCase
+import csv
+import uuid
+from decimal import Decimal
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils.timezone import now
+from rest_framework.test import APIClient
+
+from . import price_cache
+from .ledger import record_transaction, revert_transaction
+from .models import Balance, Box, Coin, Transaction
+
+
+class LedgerTests(TestCase):
+    """Runs against the configured database, the row locks of the ledger are only checked by PostgreSQL."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username="trader", password="password")
+        self.user.balance.deposit(Decimal("1000"))
+        coin = Coin.objects.create(symbol="BTC", name="Bitcoin", icon_url="btc.webp")
+        self.box = Box.objects.create(user=self.user, coin=coin)
+
+    def trade(self, type, price, amount):
+        return record_transaction(user=self.user, box=self.box, type=type, price=Decimal(price),
+                                  amount=Decimal(amount), fee=Decimal("0"), transaction_date=now())
+
+    def test_record_transaction_updates_box_and_balance(self):
+        self.trade("buy", "100", "2")
+        self.trade("sell", "150", "1")
+
+        box = Box.objects.get(pk=self.box.pk)
+        balance = Balance.objects.get(user=self.user)
+        self.assertEqual(box.total_amount, Decimal("1"))
+        self.assertEqual(box.average_buy_price, Decimal("100"))
+        self.assertEqual(box.average_sell_price, Decimal("150"))
+        self.assertEqual(balance.usdt_balance, Decimal("950"))
+        self.assertEqual(balance.coin_balance_at_cost, Decimal("100"))
+
+    def test_revert_transaction_restores_box_and_balance(self):
+        self.trade("buy", "100", "2")
+        sell = self.trade("sell", "150", "1")
+
+        revert_transaction(sell)
+
+        box = Box.objects.get(pk=self.box.pk)
+        balance = Balance.objects.get(user=self.user)
+        self.assertEqual(box.total_amount, Decimal("2"))
+        self.assertEqual(box.total_sell_amount, Decimal("0"))
+        self.assertEqual(balance.usdt_balance, Decimal("800"))
+        self.assertEqual(balance.coin_balance_at_cost, Decimal("200"))
+
+    def test_revert_last_transaction_deletes_box(self):
+        buy = self.trade("buy", "100", "2")
+
+        revert_transaction(buy)
+
+        self.assertFalse(Box.objects.filter(pk=self.box.pk).exists())
+        self.assertEqual(Balance.objects.get(user=self.user).usdt_balance, Decimal("1000"))
+
+
+class TransactionImportTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(username="importer", password="password")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def post_file(self, content):
+        file = SimpleUploadedFile("transactions.csv", content, content_type="text/csv")
+        return self.client.post(reverse("import-transactions"), {"file": file}, format="multipart")
+
+    def test_non_utf8_file_is_rejected(self):
+        response = self.post_file("coin_symbol,type,price,amount,transaction_date\n"
+                                  "BTC,buy,1,1,2024-02-01T00:00:00Z,café\n".encode("latin-1"))
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("file", response.json()["data"])
+        self.assertFalse(Transaction.objects.filter(user=self.user).exists())
+
+    def test_malformed_csv_is_rejected(self):
+        oversized_field = b'"' + b"x" * (csv.field_size_limit() + 1) + b'"'
+        response = self.post_file(b"coin_symbol,type,price,amount,transaction_date\n" + oversized_field + b",buy,1,1,\n")
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("file", response.json()["data"])
+        self.assertFalse(Transaction.objects.filter(user=self.user).exists())
+
+
+@override_settings(PRICE_VERSION_CHECK_INTERVAL=0)
+class LocalPriceCacheTests(TestCase):
+    """Runs against the configured Redis, under symbols of its own."""
+
+    def setUp(self):
+        self.local_prices = price_cache.LocalPriceCache(max_size=16, ttl=60)
+        price_cache.local_prices, self.shared_prices = self.local_prices, price_cache.local_prices
+        self.kept, self.refreshed = (f"TEST{uuid.uuid4().hex[:8].upper()}" for _ in range(2))
+
+    def tearDown(self):
+        price_cache.local_prices = self.shared_prices
+
+    def test_refresh_by_another_worker_keeps_other_symbols_local(self):
+        price_cache.set_prices({self.kept: Decimal("1"), self.refreshed: Decimal("1")})
+        # Another worker writes a new price, our own local entry is left behind
+        price_cache._price_writes(price_cache._redis(), {self.refreshed: Decimal("2")}).execute()
+
+        prices = price_cache.get_prices([self.kept, self.refreshed])
+
+        self.assertEqual(prices, {self.kept: Decimal("1"), self.refreshed: Decimal("2")})
+        self.assertEqual(self.local_prices.counts, {"l1_hits": 1, "l2_hits": 1, "misses": 0})
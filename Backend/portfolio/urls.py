@@ -3,11 +3,12 @@ from drf_yasg import openapi
 from drf_yasg.views import get_schema_view
 from rest_framework import permissions
 
+from .views.async_views import AsyncBalanceAPIView, AsyncBoxListAPIView, AsyncProfitLossSummaryAPIView
 from .views.balance_view import BalanceAPIView
 from .views.box_views import CloseBoxAPIView, BoxListAPIView, BoxDetailAPIView
 from .views.history_views import BalanceHistoryListAPIView
 from .views.summary_view import ProfitLossSummaryAPIView
-from .views.transaction_view import TransactionDeleteAPIView, TransactionCreateAPIView
+from .views.transaction_view import TransactionDeleteAPIView, TransactionCreateAPIView, TransactionImportAPIView
 
 # Swagger Schema View
 schema_view = get_schema_view(
@@ -27,6 +28,7 @@ urlpatterns = [
 
     # Transactions
     path("transactions/", TransactionCreateAPIView.as_view(), name="create-transaction"),
+    path("transactions/import/", TransactionImportAPIView.as_view(), name="import-transactions"),
     path("transactions/<int:transaction_id>/", TransactionDeleteAPIView.as_view(), name="create-transaction"), # Work on it
     # balance
     path("balance/", BalanceAPIView.as_view(), name="user-balance"),
@@ -38,4 +40,8 @@ urlpatterns = [
     path("summary/", ProfitLossSummaryAPIView.as_view(), name="profit-loss-summary"),
     # History
     path("balance/history/", BalanceHistoryListAPIView.as_view(), name="balance-history"),
+    # Async versions of the price dependent views, served when running under asgi.py
+    path("async/balance/", AsyncBalanceAPIView.as_view(), name="async-user-balance"),
+    path("async/boxes/", AsyncBoxListAPIView.as_view(), name="async-box-list"),
+    path("async/summary/", AsyncProfitLossSummaryAPIView.as_view(), name="async-profit-loss-summary"),
 ]
@@ -1,23 +1,24 @@
 import logging
-import time
 from decimal import Decimal
 
+import msgpack
 import requests
-from django.core.cache import cache
 from django.conf import settings
 
+from Backend.http_client import async_microservice, microservice
 from Backend.messages import response_message as mt
+from . import price_cache
 
 logger = logging.getLogger("backend")
 
+# MessagePack carries prices as exact decimal strings, JSON stays the fallback
+PRICE_ACCEPT = "application/msgpack, application/json;q=0.9"
+
 
 def fetch_coin_price(coin_symbol):
     """Fetch the latest price of a given coin from the API."""
-    url = f"{settings.FETCH_PRICE_MICRO_SERVICE}/coin_price/{coin_symbol}"
-
     try:
-        response = requests.get(url)
-        response.raise_for_status()  # Raise an error for bad responses (4xx, 5xx)
+        response = microservice.get(f"/coin_price/{coin_symbol}")  # Retries, raises RequestException on 4xx/5xx or an open circuit
         data = response.json()
 
         if data.get("success"):
@@ -31,107 +32,141 @@ def fetch_coin_price(coin_symbol):
         raise Exception(mt[500])
 
 
-def fetch_multiple_prices(coin_symbols):
-    """Fetch the latest prices for multiple coins in a single request."""
+def validate_coins(coin_symbols):
+    """Validate many coin symbols in one microservice call, mapping each to (success, coin name or error)."""
+    response = microservice.get("/validate_coins", params={"coin_symbols": list(coin_symbols)})
+    return {symbol: tuple(result) for symbol, result in response.json()["data"].items()}
 
-    # First, try to get prices from cache
-    cached_prices = cache.get("cached_price", {})
-    symbols_to_fetch = [symbol for symbol in coin_symbols if symbol not in cached_prices]
 
-    if not symbols_to_fetch:
-        logger.debug(f"All prices found in cache for {coin_symbols}")
-        return {symbol: cached_prices[symbol] for symbol in coin_symbols}
-
-    # Constants for lock management
-    lock_timeout = 30  # seconds
-    check_interval = 0.1  # seconds between lock checks
-    max_wait_time = 5  # seconds
-
-    # Create a tracking dictionary for coins we need to fetch
-    pending_coins = {symbol: False for symbol in symbols_to_fetch}
-
-    # Step 1: Try to acquire locks for each coin
-    for symbol in symbols_to_fetch:
-        # Create a unique and consistent lock key for each coin
-        lock_key = f"price_fetch_lock_{symbol}"
-        # Try to acquire the lock
-        if cache.add(lock_key, True, lock_timeout):
-            # Successfully acquired lock
-            pending_coins[symbol] = True
-            logger.debug(f"Acquired lock for {symbol}")
+def decode_prices(response):
+    """Return the data of a /multiple_prices response, prices as decimal strings or Decimal."""
+    if response.headers.get("Content-Type", "").startswith("application/msgpack"):
+        return msgpack.unpackb(response.content).get("data", {})
+    return response.json(parse_float=Decimal).get("data", {})
+
+
+def request_prices(coin_symbols):
+    """Ask the microservice for the prices of the given symbols, leaving out the ones it has no price for."""
+    try:
+        response = microservice.get("/multiple_prices", params={"coin_symbols": coin_symbols},
+                                    headers={"Accept": PRICE_ACCEPT})
+        data = decode_prices(response)
+    except requests.exceptions.RequestException as e:
+        logger.error(f"Error fetching multiple prices: {e}")
+        return {}
+
+    return _received_prices(coin_symbols, data)
+
+
+async def arequest_prices(coin_symbols):
+    try:
+        response = await async_microservice.get("/multiple_prices", params={"coin_symbols": coin_symbols},
+                                                headers={"Accept": PRICE_ACCEPT})
+        data = decode_prices(response)
+    except requests.exceptions.RequestException as e:
+        logger.error(f"Error fetching multiple prices: {e}")
+        return {}
+
+    return _received_prices(coin_symbols, data)
+
+
+def _received_prices(coin_symbols, data):
+    prices = {}
+    for symbol in coin_symbols:
+        if symbol in data and data[symbol][0]:
+            prices[symbol] = Decimal(data[symbol][1])
         else:
-            # Lock already exists, coin is being fetched by another process
-            logger.debug(f"Lock already exists for {symbol}, will wait")
+            logger.warning(f"No price data received for {symbol}")
+    return prices
 
-    # Step 2: Wait for other processes to complete if needed
-    coins_to_wait_for = [s for s, has_lock in pending_coins.items() if not has_lock]
-    if coins_to_wait_for:
-        logger.debug(f"Waiting for other processes to fetch: {coins_to_wait_for}")
-        start_time = time.time()
 
-        while time.time() - start_time < max_wait_time and coins_to_wait_for:
-            time.sleep(check_interval)
+def fetch_multiple_prices(coin_symbols):
+    """
+    Fetch the latest prices for multiple coins in a single request.
+    Prices are cached per symbol in Redis. Symbols another worker is already fetching
+    are waited for instead of being requested twice.
+    """
+    symbols = list(dict.fromkeys(coin_symbols))
+    prices = price_cache.get_prices(symbols)
+    missing = [symbol for symbol in symbols if symbol not in prices]
 
-            # Check if the cache has been updated with any of the coins we're waiting for
-            updated_cache = cache.get("cached_price", {})
-            # Remove coins that are now in the cache from our wait list
-            coins_to_wait_for = [s for s in coins_to_wait_for if s not in updated_cache]
+    if not missing:
+        logger.debug(f"All prices found in cache for {coin_symbols}")
+        return {symbol: prices[symbol] for symbol in coin_symbols}
 
-            if not coins_to_wait_for:
-                logger.debug("All waiting coins now in cache")
-                break
+    token, locked = price_cache.acquire_locks(missing)
+    waiting = [symbol for symbol in missing if symbol not in locked]
 
-        # After waiting, recheck the cache for all symbols
-        cached_prices = cache.get("cached_price", {})
+    if locked:
+        logger.debug(f"Now fetching prices for: {locked}")
+        try:
+            fetched = request_prices(locked)
+            price_cache.set_prices(fetched)
+            prices.update(fetched)
+        finally:
+            price_cache.release_locks(locked, token)
 
-    # Step 3: Determine which coins we still need to fetch (we have locks for these)
-    symbols_to_fetch = [s for s, has_lock in pending_coins.items() if has_lock]
+    if waiting:
+        logger.debug(f"Waiting for other processes to fetch: {waiting}")
+        prices.update(price_cache.wait_for_prices(waiting, settings.PRICE_WAIT_TIMEOUT))
 
-    # Step 4: Fetch prices for coins we have locks for
-    if symbols_to_fetch:
-        logger.debug(f"Now fetching prices for: {symbols_to_fetch}")
+    missing_symbols = [symbol for symbol in symbols if symbol not in prices]
+    if missing_symbols:
+        logger.warning(f"Missing prices for {missing_symbols}, returning zeros")
+
+    return {symbol: prices.get(symbol, Decimal(0)) for symbol in coin_symbols}
+
+
+async def afetch_multiple_prices(coin_symbols):
+    """
+    Async fetch_multiple_prices for the async views, sharing the same cache, locks and wake-ups,
+    so sync and async workers never fetch the same symbol twice.
+    """
+    symbols = list(dict.fromkeys(coin_symbols))
+    prices = await price_cache.aget_prices(symbols)
+    missing = [symbol for symbol in symbols if symbol not in prices]
+
+    if not missing:
+        logger.debug(f"All prices found in cache for {coin_symbols}")
+        return {symbol: prices[symbol] for symbol in coin_symbols}
+
+    token, locked = await price_cache.aacquire_locks(missing)
+    waiting = [symbol for symbol in missing if symbol not in locked]
+
+    if locked:
+        logger.debug(f"Now fetching prices for: {locked}")
         try:
-            url = f"{settings.FETCH_PRICE_MICRO_SERVICE}/multiple_prices"
-            response = requests.get(url, params={"coin_symbols": symbols_to_fetch})
-            response.raise_for_status()
-            data = response.json().get("data", {})
-
-            # Process the fetched data
-            fetched_prices = {}
-            for symbol in symbols_to_fetch:
-                if symbol in data and data[symbol][0]:
-                    fetched_prices[symbol] = Decimal(data[symbol][1])
-                else:
-                    fetched_prices[symbol] = Decimal(0)
-                    logger.warning(f"No price data received for {symbol}")
-
-            # Update the cache with new prices
-            cached_prices = cache.get("cached_price", {})  # Get latest version
-            cached_prices.update(fetched_prices)
-            cache.set("cached_price", cached_prices, timeout=60)
-            logger.debug(f"Updated cache with new prices for {list(fetched_prices.keys())}")
-
-        except requests.exceptions.RequestException as e:
-            logger.error(f"Error fetching multiple prices: {e}")
-            # Set default values for coins we failed to fetch
-            for symbol in symbols_to_fetch:
-                cached_prices[symbol] = Decimal(0)
+            fetched = await arequest_prices(locked)
+            await price_cache.aset_prices(fetched)
+            prices.update(fetched)
         finally:
-            # Release all locks we acquired
-            for symbol in symbols_to_fetch:
-                lock_key = f"price_fetch_lock_{symbol}"
-                cache.delete(lock_key)
-                logger.debug(f"Released lock for {symbol}")
-
-    # Step 5: Check if we have all the prices we need
-    missing_symbols = [s for s in coin_symbols if s not in cached_prices]
+            await price_cache.arelease_locks(locked, token)
+
+    if waiting:
+        logger.debug(f"Waiting for other processes to fetch: {waiting}")
+        prices.update(await price_cache.await_for_prices(waiting, settings.PRICE_WAIT_TIMEOUT))
+
+    missing_symbols = [symbol for symbol in symbols if symbol not in prices]
     if missing_symbols:
         logger.warning(f"Missing prices for {missing_symbols}, returning zeros")
-        for symbol in missing_symbols:
-            cached_prices[symbol] = Decimal(0)
 
-    # Return the prices for all requested coins
-    return {symbol: cached_prices.get(symbol, Decimal(0)) for symbol in coin_symbols}
+    return {symbol: prices.get(symbol, Decimal(0)) for symbol in coin_symbols}
+
+
+def warm_prices(coin_symbols):
+    """
+    Refresh the cached prices of the given symbols in one microservice call, before they expire.
+    Symbols a worker is fetching right now are left to it. Returns the prices stored.
+    """
+    token, locked = price_cache.acquire_locks(list(dict.fromkeys(coin_symbols)))
+    if not locked:
+        return {}
+    try:
+        prices = request_prices(locked)
+        price_cache.set_prices(prices)
+        return prices
+    finally:
+        price_cache.release_locks(locked, token)
 
 
 def fetch_coin_icon(coin_symbol: str):
@@ -139,9 +174,9 @@ def fetch_coin_icon(coin_symbol: str):
     Calls the microservice to fetch and store the coin icon.
     Returns the MinIO URL if successful.
     """
-    url = f"{settings.FETCH_PRICE_MICRO_SERVICE}/coin_icon/{coin_symbol}"
-    response = requests.get(url)
-    response.raise_for_status()
+    params = {"size": settings.COIN_ICON_SIZE, "format": settings.COIN_ICON_FORMAT}
+    timeout = (settings.MICROSERVICE_CONNECT_TIMEOUT, settings.MICROSERVICE_ICON_READ_TIMEOUT)
+    response = microservice.get(f"/coin_icon/{coin_symbol}", params=params, timeout=timeout)
 
     data = response.json()
 
@@ -150,3 +185,19 @@ def fetch_coin_icon(coin_symbol: str):
     else:
         logger.error(f"Coin {coin_symbol} icon, couldn't be fetched from api: {data}")
         return None
+
+
+def fetch_coin_icons(coin_symbols):
+    """
+    Fetch and store the icons of many coins in one /coin_icons call, mapping each symbol to its
+    MinIO URL or None. Never raises, a coin without an icon is better than a failed caller.
+    """
+    params = {"coin_symbols": list(coin_symbols), "size": settings.COIN_ICON_SIZE,
+              "format": settings.COIN_ICON_FORMAT}
+    timeout = (settings.MICROSERVICE_CONNECT_TIMEOUT, settings.MICROSERVICE_ICON_READ_TIMEOUT)
+    try:
+        response = microservice.get("/coin_icons", params=params, timeout=timeout)
+        return response.json()["data"]
+    except (requests.RequestException, ValueError, KeyError) as e:
+        logger.error(f"Coin icons of {', '.join(coin_symbols)} couldn't be fetched from api: {e}")
+        return {}
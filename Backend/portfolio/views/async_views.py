@@ -0,0 +1,117 @@
+import asyncio
+import logging
+from decimal import Decimal
+
+from asgiref.sync import sync_to_async
+from django.http import JsonResponse
+from django.views import View
+from rest_framework import status
+from rest_framework.exceptions import APIException, NotAuthenticated
+from rest_framework.settings import api_settings
+
+from Backend.messages import response_message as mt
+from Backend.utils import create_json_response
+from ..models import Balance, Box
+from ..serializers.balance_serializer import BalanceSerializer
+from ..serializers.box_serializer import BoxSerializer
+from ..utils import afetch_multiple_prices
+from .summary_view import summarize_profit_loss
+
+logger = logging.getLogger("backend")
+
+
+class AsyncAPIView(View):
+    """
+    Base of the async views, served through asgi.py.
+    DRF views only run sync, so these are plain Django views authenticated by the DRF authentication classes.
+    """
+    authentication_classes = api_settings.DEFAULT_AUTHENTICATION_CLASSES
+
+    def authenticate(self, request):
+        for authentication_class in self.authentication_classes:
+            authenticator = authentication_class()
+            user_auth = authenticator.authenticate(request)
+            if user_auth is not None:
+                return user_auth[0], authenticator
+        return None, None
+
+    async def dispatch(self, request, *args, **kwargs):
+        try:
+            user, authenticator = await sync_to_async(self.authenticate)(request)
+        except APIException as e:
+            return self.unauthorized(request, e)
+        if user is None:
+            return self.unauthorized(request, NotAuthenticated())
+
+        request.user = user
+        return await super().dispatch(request, *args, **kwargs)
+
+    def unauthorized(self, request, exc):
+        """The same 401 the DRF views answer."""
+        response = JsonResponse({"detail": exc.detail}, status=exc.status_code)
+        if self.authentication_classes:
+            response["WWW-Authenticate"] = self.authentication_classes[0]().authenticate_header(request)
+        return response
+
+
+async def boxes_with_prices(boxes):
+    """Read the open boxes once and price the coins they hold."""
+    boxes = [box async for box in boxes]
+    symbols = list(set(box.coin.symbol for box in boxes))
+    return boxes, (await afetch_multiple_prices(symbols) if symbols else {})
+
+
+async def open_boxes_with_prices(user):
+    return await boxes_with_prices(Box.objects.filter(user=user, is_closed=False).select_related("coin"))
+
+
+class AsyncBoxListAPIView(AsyncAPIView):
+    """BoxListAPIView, the open boxes are read once and their coins priced without holding a thread."""
+
+    async def get(self, request):
+        closed = request.GET.get("closed", "false").lower() == "true"
+        boxes = Box.objects.filter(user=request.user, is_closed=closed).select_related("coin") \
+            .order_by("-total_buy_value")
+
+        if not closed:
+            boxes, price_data = await boxes_with_prices(boxes)
+        else:
+            boxes = [box async for box in boxes]
+            price_data = {box.coin.symbol: Decimal(0) for box in boxes}
+
+        serializer = BoxSerializer(boxes, many=True, context={'price_data': price_data})
+        data = await sync_to_async(lambda: serializer.data)()
+
+        return create_json_response(success=True, message=mt[203],
+                                    data=data, status=status.HTTP_200_OK)
+
+
+class AsyncBalanceAPIView(AsyncAPIView):
+    """GET of BalanceAPIView, the balance is read while the open boxes are priced."""
+
+    async def get(self, request):
+        (balance, _), (open_boxes, price_data) = await asyncio.gather(
+            Balance.objects.aget_or_create(user=request.user),
+            open_boxes_with_prices(request.user),
+        )
+
+        # Valued from the boxes already read, so serializing needs no more queries
+        coin_balance = Balance.coin_balance_of(open_boxes, price_data)
+        data = BalanceSerializer(balance, context={'coin_balance': coin_balance}).data
+
+        return create_json_response(success=True, message=mt[203],
+                                    data=data, status=status.HTTP_200_OK)
+
+
+class AsyncProfitLossSummaryAPIView(AsyncAPIView):
+    """ProfitLossSummaryAPIView, the closed boxes are read while the open ones are priced."""
+
+    async def get(self, request):
+        closed_boxes, (open_boxes, price_data) = await asyncio.gather(
+            sync_to_async(list)(Box.objects.filter(user=request.user, is_closed=True).select_related("coin")),
+            open_boxes_with_prices(request.user),
+        )
+
+        return create_json_response(success=True, message=mt[203],
+                                    data=summarize_profit_loss(open_boxes, closed_boxes, price_data),
+                                    status=status.HTTP_200_OK)
@@ -57,7 +57,6 @@ class BalanceAPIView(APIView):
             balance, _ = Balance.objects.get_or_create(user=request.user)
             balance.deposit(amount)
 
-            balance.save()
             logger.info(f"user: {request.user}, deposit balance by {amount}")
             return create_response(success=True, message=mt[204],
                                    data = {"new_balance": f"{balance.usdt_balance:.8f}"}, status=status.HTTP_200_OK)
@@ -91,7 +90,6 @@ class BalanceAPIView(APIView):
                 return create_response(success=False, message=mt[400],
                                        data={"amount": "Insufficient balance"}, status=status.HTTP_400_BAD_REQUEST)
 
-            balance.save()
             logger.info(f"user: {request.user}, deposit withdraw by {amount}")
             return create_response(success=True, message=mt[204],
                                    data={"new_balance": f"{balance.usdt_balance:.8f}"}, status=status.HTTP_200_OK)
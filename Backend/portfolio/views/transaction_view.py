@@ -1,10 +1,10 @@
 import logging
 from datetime import datetime
-from decimal import Decimal
 
 import requests
-from django.db import transaction as db_transaction
 from rest_framework import status
+from rest_framework.exceptions import ValidationError
+from rest_framework.parsers import MultiPartParser
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.views import APIView
 from drf_yasg.utils import swagger_auto_schema
@@ -12,7 +12,10 @@ from drf_yasg import openapi
 
 from Backend.utils import create_response
 from Backend.messages import response_message as mt
-from ..models import Box, Transaction, Balance
+from Backend.messages import serializer_response_message as smt
+from ..importer import import_transactions
+from ..ledger import record_transaction, revert_transaction
+from ..models import Box, Transaction
 from ..serializers.transaction_serializers import TransactionSerializer
 
 logger = logging.getLogger('backend')
@@ -89,7 +92,6 @@ class TransactionCreateAPIView(APIView):
                 coin = validated_data['coin']
                 price = validated_data['price']
                 amount = validated_data['amount']
-                value = validated_data['value']
                 transaction_date = validated_data.get('transaction_date',
                                                       datetime.now())
                 fee = validated_data['fee']
@@ -97,30 +99,23 @@ class TransactionCreateAPIView(APIView):
                 box = Box.objects.get(user=user, coin=coin, is_closed=False)
 
                 try:
-                    with db_transaction.atomic():
-                        transaction = Transaction.objects.create(
-                            user=user,
-                            box=box,
-                            type=transaction_type,
-                            price=price,
-                            amount=amount,
-                            value=value,
-                            transaction_date=transaction_date,
-                            fee=fee
-                        )
-
-                        data = {
-                        "transaction_id": transaction.id,
-                        "coin_name": coin.name,
-                        }
-                        logger.info(f"Transaction created for user {user}, data: {data}")
-
-                        return create_response(success=True, message=mt[205],
-                                               data=data, status=status.HTTP_201_CREATED)
+                    transaction = record_transaction(user=user, box=box, type=transaction_type, price=price,
+                                                     amount=amount, fee=fee, transaction_date=transaction_date)
+                except ValueError:
+                    raise
                 except Exception as e:
                     logger.error(f"something went wrong on database changes : {e}")
                     return create_response(success=False, message=mt[400],
                                            status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+                data = {
+                    "transaction_id": transaction.id,
+                    "coin_name": coin.name,
+                }
+                logger.info(f"Transaction created for user {user}, data: {data}")
+
+                return create_response(success=True, message=mt[205],
+                                       data=data, status=status.HTTP_201_CREATED)
             return create_response(success=False, message=mt[400],
                                    data=serializer.errors, status=status.HTTP_400_BAD_REQUEST)
         except requests.RequestException as e:
@@ -128,7 +123,7 @@ class TransactionCreateAPIView(APIView):
             return create_response(success=False, message=str(e),
                                    status=status.HTTP_500_INTERNAL_SERVER_ERROR)
         except ValueError as e:
-            msg, data = eval(str(e), {"Decimal": Decimal})
+            msg, data = e.args
             return create_response(success=False, message=msg, data=data,
                                    status=status.HTTP_400_BAD_REQUEST)
 
@@ -173,12 +168,10 @@ class TransactionDeleteAPIView(APIView):
         user = request.user
 
         try:
-            transaction = Transaction.objects.get(id=transaction_id, user=user)
+            transaction = Transaction.objects.select_related("box").get(id=transaction_id, user=user)
             box = transaction.box
-            balance = user.balance
-            fee_multiplier = Decimal('1') - (transaction.fee / Decimal('100'))
 
-            last_transaction = box.transactions.order_by('-created_at').first()
+            last_transaction = box.transactions.order_by('-transaction_date', '-id').first()
 
             if transaction != last_transaction:
                 return create_response(success=False, message=mt[408], status=status.HTTP_400_BAD_REQUEST)
@@ -186,43 +179,68 @@ class TransactionDeleteAPIView(APIView):
             if box.is_closed:
                 return create_response(success=False, message=mt[407], status=status.HTTP_400_BAD_REQUEST)
 
-            with db_transaction.atomic():
-                if transaction.type == 'buy':
-
-                    balance.deposit((transaction.amount / fee_multiplier) * transaction.price)
+            revert_transaction(transaction)
 
-                    box.total_amount -= transaction.amount
-                    box.total_buy_value -= transaction.value
-                    box.total_buy_amount -= transaction.amount
-
-                    if box.total_buy_amount > 0:
-                        box.average_buy_price = box.total_buy_value / box.total_buy_amount
-                    else:
-                        box.average_buy_price = Decimal('0')
+            return create_response(success=True, message=mt[207], status=status.HTTP_204_NO_CONTENT)
+        except Transaction.DoesNotExist:
+            return create_response(success=False, message=mt[404], status=status.HTTP_404_NOT_FOUND)
+        except ValueError as e:
+            msg, data = e.args
+            return create_response(success=False, message=msg, data=data, status=status.HTTP_400_BAD_REQUEST)
+        except Exception as e:
+            logger.error(f"Error deleting transaction: {e}")
+            return create_response(success=False, message=mt[400], status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
-                elif transaction.type == 'sell':
-                    balance.withdraw(transaction.value * (Decimal('1') - transaction.fee / Decimal('100')))
 
-                    box.total_amount += transaction.amount
-                    box.total_sell_value -= transaction.value
-                    box.total_sell_amount -= transaction.amount
+class TransactionImportAPIView(APIView):
+    """Import many buy/sell transactions at once from an uploaded CSV file."""
+    permission_classes = [IsAuthenticated]
+    parser_classes = [MultiPartParser]
 
-                    if box.total_sell_amount > 0:
-                        box.average_sell_price = box.total_sell_value / box.total_sell_amount
-                    else:
-                        box.average_sell_price = Decimal('0')
+    @swagger_auto_schema(
+        operation_summary="Import Transactions",
+        operation_description="Upload a CSV with the columns coin_symbol, type, price, amount, fee (optional) "
+                              "and transaction_date. Rows are applied in date order, the ones that can't be "
+                              "applied are skipped and reported by row number.",
+        manual_parameters=[
+            openapi.Parameter('file', in_=openapi.IN_FORM, type=openapi.TYPE_FILE, required=True,
+                              description='CSV file of transactions'),
+        ],
+        responses={
+            201: openapi.Response(
+                "Transactions imported",
+                openapi.Schema(
+                    type=openapi.TYPE_OBJECT,
+                    properties={
+                        "imported": openapi.Schema(type=openapi.TYPE_INTEGER, example=980),
+                        "failed": openapi.Schema(type=openapi.TYPE_INTEGER, example=20),
+                        "errors": openapi.Schema(type=openapi.TYPE_ARRAY, items=openapi.Schema(
+                            type=openapi.TYPE_OBJECT)),
+                    },
+                ),
+            ),
+        },
+        tags=["💼 Transactions"],
+    )
+    def post(self, request):
+        file = request.FILES.get("file")
+        if file is None:
+            return create_response(success=False, message=mt[400],
+                                   data={"file": smt[14]}, status=status.HTTP_400_BAD_REQUEST)
 
-                transaction.delete()
-                
-                balance.save()
-                box.save()
+        try:
+            report = import_transactions(request.user, file)
+        except ValidationError as e:
+            return create_response(success=False, message=mt[400],
+                                   data=e.detail, status=status.HTTP_400_BAD_REQUEST)
+        except requests.RequestException as e:
+            logger.error(f"requests error happen: {e}")
+            return create_response(success=False, message=mt[500],
+                                   status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
-                if not box.transactions.exists():
-                    box.delete()
+        if not report["imported"]:
+            return create_response(success=False, message=smt[16],
+                                   data=report, status=status.HTTP_400_BAD_REQUEST)
 
-                return create_response(success=True, message=mt[207], status=status.HTTP_204_NO_CONTENT)
-        except Transaction.DoesNotExist:
-            return create_response(success=False, message=mt[404], status=status.HTTP_404_NOT_FOUND)
-        except Exception as e:
-            logger.error(f"Error deleting transaction: {e}")
-            return create_response(success=False, message=mt[400], status=status.HTTP_500_INTERNAL_SERVER_ERROR)
\ No newline at end of file
+        return create_response(success=True, message=mt[208],
+                               data=report, status=status.HTTP_201_CREATED)
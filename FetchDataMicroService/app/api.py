@@ -1,5 +1,17 @@
-from fastapi import APIRouter, Query
+import os
+import json
+from typing import Optional
+
+from fastapi import APIRouter, HTTPException, Query, Request
+from fastapi.responses import Response, StreamingResponse
 from app.coingecko import CoinGeckoAPI
+from app.encoding import negotiated_prices
+from app.history import GRANULARITIES, INTERVALS
+from app.icons import ICON_SIZES, ICON_FORMATS
+from app.metrics import render
+from app.price_stream import SubscriptionLimitError
+
+STREAM_HEARTBEAT_SECONDS = float(os.getenv("STREAM_HEARTBEAT_SECONDS", 15))
 
 router = APIRouter()
 api = CoinGeckoAPI()
@@ -10,20 +22,105 @@ async def validate_coin(coin_symbol: str):
     success, result = await api.validate_coin_symbol(coin_symbol)
     return {"success": success, "data": result}
 
+@router.get("/validate_coins")
+async def validate_coins(coin_symbols: list[str] = Query(...)):
+    """Validate multiple coin symbols in one call, each mapped to [success, CoinGecko ID or error]."""
+    return {"data": await api.validate_coin_symbols(coin_symbols)}
+
 @router.get("/coin_price/{coin_symbol}")
 async def get_coin_price(coin_symbol: str):
-    """Fetch the latest price of a coin."""
+    """Fetch the latest price of a coin, with the age of the price in seconds and a staleness flag."""
     success, result = await api.get_coin_price(coin_symbol)
-    return {"success": success, "price": f"{result:.8f}"}
+    if not success:
+        return {"success": success, "price": result}
+    return {"success": success, "price": f"{result:.8f}", **api.price_meta([coin_symbol])[coin_symbol]}
+
+def _validate_icon_variant(size: Optional[int], image_format: str):
+    if size is not None and size not in ICON_SIZES:
+        raise HTTPException(status_code=400, detail=f"Icon size must be one of {ICON_SIZES}.")
+    if image_format not in ICON_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Icon format must be one of {list(ICON_FORMATS)}.")
 
 @router.get("/coin_icon/{coin_symbol}")
-async def get_coin_icon(coin_symbol: str):
-    """Fetch the coin icon, store in MinIO, and return its URL."""
-    icon_url = await api.fetch_and_save_coin_icon(coin_symbol)
+async def get_coin_icon(coin_symbol: str, size: Optional[int] = None, format: str = "png"):
+    """Fetch the coin icon, store in MinIO, and return the URL of the original or of a resized variant."""
+    _validate_icon_variant(size, format)
+
+    icon_url = (await api.get_coin_icons([coin_symbol], size, format))[coin_symbol.lower()]
     return {"success": bool(icon_url), "icon_url": icon_url}
 
+@router.get("/coin_icons")
+async def get_coin_icons(coin_symbols: list[str] = Query(...), size: Optional[int] = None, format: str = "png"):
+    """Fetch the icons of multiple coins, store the missing ones in MinIO, and return their URLs."""
+    _validate_icon_variant(size, format)
+
+    icon_urls = await api.get_coin_icons(coin_symbols, size, format)
+    return {"data": {symbol: icon_urls[symbol.lower()] for symbol in coin_symbols}}
+
 @router.get("/multiple_prices")
-async def get_multiple_prices(coin_symbols: list[str] = Query(...)):
-    """Fetch prices for multiple coins."""
+async def get_multiple_prices(request: Request, coin_symbols: list[str] = Query(...)):
+    """
+    Fetch prices for multiple coins, with the age of each price in seconds and a staleness flag.
+    Clients sending Accept: application/msgpack get MessagePack with prices as decimal strings.
+    """
     results = await api.get_multiple_prices(coin_symbols)
-    return {"data": results}
+    return negotiated_prices(request, results, api.price_meta(list(results)))
+
+@router.get("/coin_history/{coin_symbol}")
+async def get_coin_history(coin_symbol: str, days: int = Query(30, ge=1), interval: str = "1d"):
+    """Fetch [timestamp, open, high, low, close] candles of a coin for the last days."""
+    if interval not in INTERVALS:
+        raise HTTPException(status_code=400, detail=f"Interval must be one of {list(INTERVALS)}.")
+    max_days = GRANULARITIES[INTERVALS[interval][0]]["max_days"]
+    if days > max_days:
+        raise HTTPException(status_code=400, detail=f"At most {max_days} days of {interval} candles are available.")
+
+    success, result = await api.get_coin_history(coin_symbol, days, interval)
+    if not success:
+        return {"success": success, "data": result}
+    return {"success": success, "data": {"interval": interval, "candles": result}}
+
+async def _price_events(request: Request, symbols_by_id: dict[str, list[str]]):
+    """
+    Server-sent events with the latest price of every followed coin, sent as they are refreshed.
+    The subscription is only registered once the response streams, so a client gone before then leaves none behind.
+    """
+    try:
+        subscription = api.subscribe_prices(symbols_by_id)
+    except SubscriptionLimitError as e:
+        yield f"event: error\ndata: {json.dumps({'detail': str(e)})}\n\n"
+        return
+
+    try:
+        while not await request.is_disconnected():
+            updates = await subscription.next_updates(STREAM_HEARTBEAT_SECONDS)
+            if not updates:
+                yield ": keep-alive\n\n"
+                continue
+
+            data = {symbol: {"price": f"{price:.8f}", "fetched_at": fetched_at}
+                    for symbol, (price, fetched_at) in updates.items()}
+            yield f"event: prices\ndata: {json.dumps(data)}\n\n"
+    finally:
+        api.broadcaster.unsubscribe(subscription)
+
+@router.get("/price_stream")
+async def stream_prices(request: Request, coin_symbols: list[str] = Query(...)):
+    """Stream price updates of multiple coins as server-sent events."""
+    symbols_by_id = await api.resolve_stream_symbols(coin_symbols)
+    return StreamingResponse(
+        _price_events(request, symbols_by_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@router.get("/stats")
+async def get_stats():
+    """Internal counters of the upstream client."""
+    return api.stats()
+
+@router.get("/metrics")
+async def get_metrics():
+    """Expose latency histograms, cache and limiter counters in the Prometheus text format."""
+    body, content_type = render()
+    return Response(content=body, media_type=content_type)
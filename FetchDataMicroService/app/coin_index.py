@@ -0,0 +1,89 @@
+import os
+import json
+import math
+import logging
+from datetime import datetime
+from typing import Optional
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+COIN_INDEX_PATH = os.getenv("COIN_INDEX_PATH", "data/coin_index.json")
+
+logger = logging.getLogger(__name__)
+
+
+class CoinIndex:
+    """In-memory symbol -> CoinGecko id index, persisted to a local file for fast restarts."""
+
+    def __init__(self, path: str = COIN_INDEX_PATH):
+        self.path = path
+        self.symbols: dict[str, str] = {}
+        self.ids: dict[str, str] = {}
+        self.updated_at: Optional[datetime] = None
+
+    @property
+    def ready(self) -> bool:
+        return bool(self.symbols)
+
+    def resolve(self, coin_symbol: str) -> Optional[str]:
+        """Return the CoinGecko id of a symbol, or None if the symbol is unknown."""
+        return self.symbols.get(coin_symbol.lower())
+
+    def symbol_of(self, coin_id: str) -> Optional[str]:
+        """Return the symbol that resolves to a CoinGecko id, None if no symbol does."""
+        return self.ids.get(coin_id)
+
+    def _index_ids(self):
+        self.ids = {coin_id: symbol for symbol, coin_id in self.symbols.items()}
+
+    def build(self, coins: list[dict], ranks: dict[str, int]):
+        """
+        Rebuild the index from the bulk coins list.
+        Ambiguous symbols resolve to the coin with the best market cap rank,
+        unranked coins lose against ranked ones and ties fall back to the id.
+        """
+        best: dict[str, tuple] = {}
+        for coin in coins:
+            symbol = (coin.get("symbol") or "").lower()
+            coin_id = coin.get("id")
+            if not symbol or not coin_id:
+                continue
+            key = (ranks.get(coin_id) or math.inf, coin_id)
+            if symbol not in best or key < best[symbol]:
+                best[symbol] = key
+
+        self.symbols = {symbol: key[1] for symbol, key in best.items()}
+        self._index_ids()
+        self.updated_at = datetime.now()
+
+    def load(self) -> bool:
+        """Load a previously saved index, return False if there is none."""
+        try:
+            with open(self.path, encoding="utf-8") as file:
+                data = json.load(file)
+        except (OSError, ValueError):
+            return False
+
+        self.symbols = data.get("symbols", {})
+        self._index_ids()
+        self.updated_at = datetime.fromisoformat(data["updated_at"])
+        logger.info(f"Loaded {len(self.symbols)} coins from {self.path}")
+        return self.ready
+
+    def save(self):
+        """Write the index atomically so concurrent workers never read a partial file."""
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as file:
+            json.dump({"updated_at": self.updated_at.isoformat(), "symbols": self.symbols}, file)
+        os.replace(tmp_path, self.path)
+
+    def is_stale(self, max_age_seconds: float) -> bool:
+        if not self.updated_at:
+            return True
+        return (datetime.now() - self.updated_at).total_seconds() > max_age_seconds
@@ -1,94 +1,408 @@
 import os
+import math
+import time
 import asyncio
-from datetime import datetime, timedelta
+import logging
+from datetime import datetime
+from functools import partial
+from email.utils import parsedate_to_datetime
 from typing import Optional
 
 import aiohttp
+import numpy as np
 from fastapi import HTTPException
 from dotenv import load_dotenv
 
+from .circuit_breaker import CircuitBreaker
+from .coin_index import CoinIndex
+from .history import PriceHistoryStore, RECORD, GRANULARITIES, INTERVALS, DAY_MS, slice_range, resample_ohlc
+from .icons import render_variants
+from .metrics import (PRICE_CACHE_LOOKUPS, UPSTREAM_IN_FLIGHT, UPSTREAM_LATENCY, UPSTREAM_RESPONSES,
+                      upstream_endpoint)
 from .minio import MinioClient
+from .price_cache import PriceStore, HotSet
+from .providers import HedgedPriceFetcher, build_providers
+from .price_stream import PriceBroadcaster, Subscription, SubscriptionLimitError
+from .rate_limiter import TokenBucketRateLimiter, PRIORITY_INTERACTIVE, PRIORITY_BACKGROUND
+from .singleflight import SingleFlight
+from .worker_lock import WorkerLock
 
 load_dotenv()
 API_KEY = os.getenv("API_KEY")
 FETCH_SOURCE = os.getenv("COINGECKOAPI")
 
+# Connection pool shared by every upstream call of the process
+HTTP_POOL_LIMIT = int(os.getenv("HTTP_POOL_LIMIT", 100))
+HTTP_POOL_LIMIT_PER_HOST = int(os.getenv("HTTP_POOL_LIMIT_PER_HOST", 20))
+HTTP_KEEPALIVE_TIMEOUT = float(os.getenv("HTTP_KEEPALIVE_TIMEOUT", 30))
+HTTP_DNS_CACHE_TTL = int(os.getenv("HTTP_DNS_CACHE_TTL", 300))
+HTTP_TOTAL_TIMEOUT = float(os.getenv("HTTP_TOTAL_TIMEOUT", 10))
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", 3))
+
+# Upstream rate limit, per worker process
+RATE_LIMIT_PER_SECOND = float(os.getenv("RATE_LIMIT_PER_SECOND", 2))
+RATE_LIMIT_BURST = int(os.getenv("RATE_LIMIT_BURST", 1))
+RATE_LIMIT_MAX_RETRIES = int(os.getenv("RATE_LIMIT_MAX_RETRIES", 2))
+RATE_LIMIT_DEFAULT_RETRY_AFTER = float(os.getenv("RATE_LIMIT_DEFAULT_RETRY_AFTER", 10))
+RATE_LIMIT_MAX_RETRY_AFTER = float(os.getenv("RATE_LIMIT_MAX_RETRY_AFTER", 30))
+
+# Stop calling the upstream after repeated failures or 429s
+CIRCUIT_FAILURE_THRESHOLD = int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", 5))
+CIRCUIT_RESET_TIMEOUT = float(os.getenv("CIRCUIT_RESET_TIMEOUT", 30))
+
+# Local symbol -> id index, rebuilt from the bulk coins list
+COIN_INDEX_REFRESH_SECONDS = int(os.getenv("COIN_INDEX_REFRESH_SECONDS", 6 * 60 * 60))
+COIN_INDEX_RETRY_SECONDS = int(os.getenv("COIN_INDEX_RETRY_SECONDS", 60))
+COIN_INDEX_MARKET_PAGES = int(os.getenv("COIN_INDEX_MARKET_PAGES", 4))
+
+# Batching of simple/price lookups
+PRICE_BATCH_SIZE = int(os.getenv("PRICE_BATCH_SIZE", 250))
+PRICE_BATCH_MAX_URL_LENGTH = int(os.getenv("PRICE_BATCH_MAX_URL_LENGTH", 2000))
+PRICE_BATCH_CONCURRENCY = int(os.getenv("PRICE_BATCH_CONCURRENCY", 2))
+
+# In-memory prices kept warm by polling the hot set of coin ids
+PRICE_MAX_AGE = float(os.getenv("PRICE_MAX_AGE", 60))
+PRICE_STALE_TTL = float(os.getenv("PRICE_STALE_TTL", 15 * 60))
+PRICE_POLL_INTERVAL = float(os.getenv("PRICE_POLL_INTERVAL", 30))
+HOT_SET_SIZE = int(os.getenv("HOT_SET_SIZE", 500))
+HOT_SET_HALF_LIFE = float(os.getenv("HOT_SET_HALF_LIFE", 15 * 60))
+HOT_COINS = os.getenv("HOT_COINS", "").split(",")
+
+# Icon downloads
+ICON_FETCH_CONCURRENCY = int(os.getenv("ICON_FETCH_CONCURRENCY", 4))
+ICON_PREFETCH_TOP_N = int(os.getenv("ICON_PREFETCH_TOP_N", 0))
+
+# Local price history, the tail is only synced again after this many seconds
+HISTORY_RECHECK_SECONDS = int(os.getenv("HISTORY_RECHECK_SECONDS", 300))
+
+# Streaming price subscriptions, per worker process
+STREAM_MAX_SUBSCRIPTIONS = int(os.getenv("STREAM_MAX_SUBSCRIPTIONS", 1000))
+STREAM_MAX_SYMBOLS = int(os.getenv("STREAM_MAX_SYMBOLS", 100))
+
+logger = logging.getLogger(__name__)
+
+
 class CoinGeckoAPI:
     def __init__(self):
         self.api_key = API_KEY
         self.session: Optional[aiohttp.ClientSession] = None
         self.headers = {
             "accept": "application/json",
-            "x-cg-demo-api-key": self.api_key
         }
-        self.last_request_time = datetime.now()
-        self.min_request_interval = timedelta(milliseconds=500)
+        if self.api_key:  # The local fake upstream needs no key
+            self.headers["x-cg-demo-api-key"] = self.api_key
+        self.rate_limiter = TokenBucketRateLimiter(RATE_LIMIT_PER_SECOND, RATE_LIMIT_BURST)
+        self.breaker = CircuitBreaker(CIRCUIT_FAILURE_THRESHOLD, CIRCUIT_RESET_TIMEOUT)
         self.minio_client = MinioClient()
+        self.coin_index = CoinIndex()
+        self.background_lock = WorkerLock()
+        self._background_tasks: list[asyncio.Task] = []
+        self._price_batch_semaphore = asyncio.Semaphore(PRICE_BATCH_CONCURRENCY)
+        self.price_flight = SingleFlight("price")
+        self.price_hedger = HedgedPriceFetcher(build_providers(self))
+        self.price_store = PriceStore()
+        self.hot_set = HotSet(HOT_SET_HALF_LIFE, HOT_SET_SIZE, HOT_COINS)
+        self.broadcaster = PriceBroadcaster(STREAM_MAX_SUBSCRIPTIONS, STREAM_MAX_SYMBOLS)
+        self.icon_flight = SingleFlight("icon")
+        self.history = PriceHistoryStore()
+        self.history_flight = SingleFlight("history")
+        self._history_checked_at: dict[tuple[str, str], float] = {}
+        self._icon_semaphore = asyncio.Semaphore(ICON_FETCH_CONCURRENCY)
+        self._revalidations: set[asyncio.Task] = set()
+        self.memory_hits = 0
+        self.stale_hits = 0
+        self.cold_fetches = 0
 
-    async def __aenter__(self):
-        self.session = aiohttp.ClientSession()
-        return self
+    async def start(self):
+        """Open the pooled HTTP session and start background jobs, called once from the app lifespan."""
+        if self.session and not self.session.closed:
+            return
+        self._open_session()
+        await self.minio_client.start()
+
+        self.coin_index.load()
+        self._background_tasks.append(asyncio.create_task(self._refresh_coin_index_periodically()))
+        self._background_tasks.append(asyncio.create_task(self._poll_hot_prices_periodically()))
+        # Icons are shared through MinIO, one worker prefetching them is enough
+        if ICON_PREFETCH_TOP_N and self.background_lock.acquire():
+            self._background_tasks.append(asyncio.create_task(self.prefetch_top_icons(ICON_PREFETCH_TOP_N)))
+
+    def _open_session(self):
+        connector = aiohttp.TCPConnector(
+            limit=HTTP_POOL_LIMIT,
+            limit_per_host=HTTP_POOL_LIMIT_PER_HOST,
+            keepalive_timeout=HTTP_KEEPALIVE_TIMEOUT,
+            ttl_dns_cache=HTTP_DNS_CACHE_TTL,
+        )
+        timeout = aiohttp.ClientTimeout(total=HTTP_TOTAL_TIMEOUT, connect=HTTP_CONNECT_TIMEOUT)
+        self.session = aiohttp.ClientSession(connector=connector, timeout=timeout)
+
+    async def close(self):
+        """Stop background jobs, close the pooled HTTP session and release its connections."""
+        tasks = [*self._background_tasks, *self._revalidations]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._background_tasks.clear()
+        self.background_lock.release()
+
+        await self.minio_client.close()
 
-    async def __aexit__(self, exc_type, exc_val, exc_tb):
         if self.session:
             await self.session.close()
+            self.session = None
 
-    async def _wait_for_rate_limit(self):
-        now = datetime.now()
-        time_since_last_request = now - self.last_request_time
-        if time_since_last_request < self.min_request_interval:
-            await asyncio.sleep((self.min_request_interval - time_since_last_request).total_seconds())
-        self.last_request_time = datetime.now()
+    async def _get_session(self) -> aiohttp.ClientSession:
+        if not self.session or self.session.closed:
+            self._open_session()
+        return self.session
 
-    async def fetch_and_save_coin_icon(self, coin:str) -> Optional[str]:
-        """Fetch the coin icon, save in MinIO, and return its URL."""
-        coin = coin.lower()
+    @staticmethod
+    def _retry_after(response: aiohttp.ClientResponse) -> float:
+        """Seconds to back off after a 429, read from the Retry-After header."""
+        value = response.headers.get("Retry-After")
+        if not value:
+            return RATE_LIMIT_DEFAULT_RETRY_AFTER
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            pass
+        try:
+            return max(0.0, (parsedate_to_datetime(value) - datetime.now().astimezone()).total_seconds())
+        except (TypeError, ValueError):
+            return RATE_LIMIT_DEFAULT_RETRY_AFTER
 
-        # Check if icon exists in MinIO
-        existing_icon_url = await self.minio_client.icon_exists(coin)
-        if existing_icon_url:
-            return existing_icon_url
+    async def _get(self, url: str, priority: int, as_json: bool = True, headers: Optional[dict] = None,
+                   breaker: Optional[CircuitBreaker] = None, rate_limiter: Optional[TokenBucketRateLimiter] = None):
+        """
+        Send a rate limited GET and return the decoded body, honoring Retry-After on 429.
+        With a breaker, 429s, 5xx and connection errors count as upstream failures.
+        Other hosts pass their own rate limiter, the default one is the CoinGecko limit.
+        """
+        session = await self._get_session()
+        rate_limiter = rate_limiter or self.rate_limiter
+        endpoint = upstream_endpoint(url)
 
-        success, coin_id = await self.validate_coin_symbol(coin)
-        if not success:
-            return None
+        for attempt in range(RATE_LIMIT_MAX_RETRIES + 1):
+            if breaker:
+                breaker.before_call()
 
-        await self._wait_for_rate_limit()
+            healthy = None
+            try:
+                await rate_limiter.acquire(priority)
+                with UPSTREAM_IN_FLIGHT.track_inprogress(), UPSTREAM_LATENCY.labels(endpoint).time():
+                    async with session.get(url, headers=headers) as response:
+                        UPSTREAM_RESPONSES.labels(endpoint, str(response.status)).inc()
+                        healthy = response.status != 429 and response.status < 500
+                        if response.status == 429:
+                            retry_after = self._retry_after(response)
+                            rate_limiter.penalize(retry_after)
+                            if attempt < RATE_LIMIT_MAX_RETRIES and retry_after <= RATE_LIMIT_MAX_RETRY_AFTER:
+                                logger.warning(f"Upstream rate limited {url}, retrying in {retry_after}s")
+                                continue
+                        response.raise_for_status()
+                        return await response.json() if as_json else await response.read()
 
-        url = f"{FETCH_SOURCE}api/v3/coins/{coin_id}"
+            except (aiohttp.ClientError, asyncio.TimeoutError):
+                if healthy is None:
+                    healthy = False
+                    UPSTREAM_RESPONSES.labels(endpoint, "error").inc()
+                raise
+            finally:
+                if breaker:
+                    if healthy is None:
+                        breaker.release()
+                    elif healthy:
+                        breaker.record_success()
+                    else:
+                        breaker.record_failure()
+
+    async def _get_json(self, url: str, priority: int = PRIORITY_INTERACTIVE):
+        """Send a rate limited GET to the upstream API and return the decoded body."""
+        return await self._get(url, priority, headers=self.headers, breaker=self.breaker)
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.close()
 
-        async with aiohttp.ClientSession() as session:
-            async with session.get(url, headers=self.headers) as response:
-                response.raise_for_status()
-                data = await response.json()
+    def stats(self) -> dict:
+        return {
+            "rate_limiter": self.rate_limiter.stats(),
+            "circuit_breaker": self.breaker.stats(),
+            "price_coalescing": self.price_flight.stats(),
+            "price_providers": self.price_hedger.stats(),
+            "price_memory": {
+                "stored": len(self.price_store.prices),
+                "hits": self.memory_hits,
+                "stale_hits": self.stale_hits,
+                "cold_fetches": self.cold_fetches,
+                "hot_set": self.hot_set.stats(),
+            },
+            "price_stream": self.broadcaster.stats(),
+            "icon_index": self.minio_client.stats(),
+            "icon_coalescing": self.icon_flight.stats(),
+        }
 
-        icon_url = data.get("image", {}).get("large")
+    async def _download_coin_icon(self, coin: str, icon_url: Optional[str] = None) -> Optional[bytes]:
+        """Download the large upstream icon of a coin, looking up its URL unless it is known."""
         if not icon_url:
-            return None
+            success, coin_id = await self.validate_coin_symbol(coin)
+            if not success:
+                return None
+
+            data = await self._get_json(f"{FETCH_SOURCE}api/v3/coins/{coin_id}", PRIORITY_BACKGROUND)
+
+            icon_url = data.get("image", {}).get("large")
+            if not icon_url:
+                return None
 
         # Download the image
-        await self._wait_for_rate_limit()
+        return await self._get(icon_url, PRIORITY_BACKGROUND, as_json=False)
+
+    async def fetch_and_save_coin_icon(self, coin: str, size: Optional[int] = None,
+                                       image_format: str = "png", icon_url: Optional[str] = None) -> Optional[str]:
+        """
+        Fetch the coin icon, save it with its resized variants in MinIO, and return its URL.
+        Without a size the URL of the original upstream image is returned.
+        """
+        coin = coin.lower()
+
+        # Each key is checked once, against the bucket index when it is loaded
+        if size is not None:
+            variant_url = await self.minio_client.icon_variant_url(coin, size, image_format)
+            if variant_url:
+                return variant_url
+
+        original_url = await self.minio_client.icon_exists(coin)
+        if original_url and size is None:
+            return original_url
+
+        if original_url:
+            # Stored before variants were introduced, render them from the original
+            image_data = await self.minio_client.download_icon(coin)
+        else:
+            image_data = await self._download_coin_icon(coin, icon_url)
+            if not image_data:
+                return None
+
+            # Upload to MinIO
+            original_url = await self.minio_client.upload_icon(coin, image_data)
+
+        try:
+            variants = await asyncio.to_thread(render_variants, image_data)
+            await self.minio_client.upload_icon_variants(coin, variants)
+        except Exception as e:
+            logger.error(f"Icon variants of {coin} could not be created: {e}")
+
+        return self.minio_client.known_icon_url(coin, size, image_format) or original_url
 
-        async with aiohttp.ClientSession() as session:
-            async with session.get(icon_url) as icon_response:
-                icon_response.raise_for_status()
-                image_data = await icon_response.read()
+    async def get_coin_icons(self, coins: list[str], size: Optional[int] = None, image_format: str = "png",
+                             icon_urls: Optional[dict[str, str]] = None) -> dict[str, Optional[str]]:
+        """
+        Return {coin: icon URL} for many coins. Icons already in MinIO are answered from the
+        index, icons another request is already fetching are shared, and the rest are
+        downloaded a few at a time under the shared rate limiter.
+        """
+        coins = list(dict.fromkeys(coin.lower() for coin in coins))
+        icon_urls = icon_urls or {}
 
-        # Upload to MinIO
-        minio_url = await self.minio_client.upload_icon(coin, image_data)
-        return minio_url
+        urls, missing = {}, []
+        for coin in coins:
+            urls[coin] = self.minio_client.known_icon_url(coin, size, image_format)
+            if not urls[coin]:
+                missing.append((coin, size, image_format))
+
+        async def fetch_one(key: tuple) -> Optional[str]:
+            async with self._icon_semaphore:
+                try:
+                    return await self.fetch_and_save_coin_icon(*key, icon_url=icon_urls.get(key[0]))
+                except Exception as e:
+                    logger.error(f"Icon of {key[0]} could not be fetched: {e}")
+                    return None
+
+        async def fetch(keys: list[tuple]) -> dict[tuple, Optional[str]]:
+            return dict(zip(keys, await asyncio.gather(*(fetch_one(key) for key in keys))))
+
+        if missing:
+            fetched = await self.icon_flight.fetch_many(missing, fetch)
+            urls.update({coin: fetched.get((coin, size, image_format)) for coin, _, _ in missing})
+        return urls
+
+    async def prefetch_top_icons(self, count: int):
+        """Store the icons of the top coins by market cap so new coins never wait on a download."""
+        icon_urls = {}
+        try:
+            for page in range(1, (count - 1) // 250 + 2):
+                markets = await self._get_json(
+                    f"{FETCH_SOURCE}api/v3/coins/markets?vs_currency=usd&order=market_cap_desc"
+                    f"&per_page={min(count, 250)}&page={page}",
+                    PRIORITY_BACKGROUND,
+                )
+                # Markets come by market cap, the first coin of a shared symbol is the one the index resolves
+                for coin in markets:
+                    icon_urls.setdefault(coin["symbol"].lower(), coin.get("image"))
+        except Exception as e:
+            logger.error(f"Top coins for the icon prefetch could not be listed: {e}")
+            return
+
+        coins = list(icon_urls)[:count]
+        started = time.monotonic()
+        urls = await self.get_coin_icons(coins, icon_urls=icon_urls)
+        # Fewer than count once shared symbols collapse
+        logger.info(f"Prefetched {sum(1 for url in urls.values() if url)}/{len(coins)} coin icons "
+                    f"of the distinct symbols among the top {count} coins in {time.monotonic() - started:.1f}s")
+
+    async def refresh_coin_index(self) -> bool:
+        """Rebuild the symbol index from the bulk coins list and market cap ranks."""
+        try:
+            coins = await self._get_json(f"{FETCH_SOURCE}api/v3/coins/list", PRIORITY_BACKGROUND)
+
+            ranks = {}
+            for page in range(1, COIN_INDEX_MARKET_PAGES + 1):
+                markets = await self._get_json(
+                    f"{FETCH_SOURCE}api/v3/coins/markets?vs_currency=usd&order=market_cap_desc"
+                    f"&per_page=250&page={page}",
+                    PRIORITY_BACKGROUND,
+                )
+                ranks.update({coin["id"]: coin["market_cap_rank"] for coin in markets if coin.get("market_cap_rank")})
+
+            self.coin_index.build(coins, ranks)
+            await asyncio.to_thread(self.coin_index.save)
+            logger.info(f"Coin index refreshed with {len(self.coin_index.symbols)} symbols")
+            return True
+
+        except Exception as e:
+            logger.error(f"Coin index refresh failed: {e}")
+            return False
 
+    async def _refresh_coin_index_periodically(self):
+        """The worker holding the background lock rebuilds the index, the others reload the file it saves."""
+        while True:
+            if not self.coin_index.is_stale(COIN_INDEX_REFRESH_SECONDS):
+                age = (datetime.now() - self.coin_index.updated_at).total_seconds()
+                delay = COIN_INDEX_REFRESH_SECONDS - age
+            elif self.background_lock.acquire():
+                refreshed = await self.refresh_coin_index()
+                delay = COIN_INDEX_REFRESH_SECONDS if refreshed else COIN_INDEX_RETRY_SECONDS
+            else:
+                await asyncio.to_thread(self.coin_index.load)
+                delay = COIN_INDEX_RETRY_SECONDS if self.coin_index.is_stale(COIN_INDEX_REFRESH_SECONDS) else 0
+            await asyncio.sleep(delay)
 
     async def validate_coin_symbol(self, coin_symbol: str):
         """Validate a coin symbol and return the correct CoinGecko ID."""
-        try:
-            await self._wait_for_rate_limit()
-            url = f"{FETCH_SOURCE}api/v3/search?query={coin_symbol}"
+        if self.coin_index.ready:
+            coin_id = self.coin_index.resolve(coin_symbol)
+            if coin_id:
+                return True, coin_id
+            return False, f"Coin '{coin_symbol}' not found."
 
-            async with aiohttp.ClientSession() as session:
-                async with session.get(url, headers=self.headers) as response:
-                    response.raise_for_status()
-                    data = await response.json()
+        # The index is not built yet, fall back to the search endpoint
+        try:
+            data = await self._get_json(f"{FETCH_SOURCE}api/v3/search?query={coin_symbol}")
 
             coins = data.get("coins", [])
             if not coins:
@@ -103,6 +417,229 @@ class CoinGeckoAPI:
         except Exception as e:
             raise HTTPException(status_code=500, detail=str(e))
 
+    async def validate_coin_symbols(self, coin_symbols: list[str]) -> dict:
+        """Validate many coin symbols at once, mapping each to (success, CoinGecko ID or error)."""
+        symbols = list(dict.fromkeys(coin_symbols))
+        validations = await asyncio.gather(*(self.validate_coin_symbol(symbol) for symbol in symbols))
+        return dict(zip(symbols, validations))
+
+    @staticmethod
+    def _price_url(coin_ids: list[str]) -> str:
+        return f"{FETCH_SOURCE}api/v3/simple/price?ids={','.join(coin_ids)}&vs_currencies=usd"
+
+    def _chunk_coin_ids(self, coin_ids: list[str]) -> list[list[str]]:
+        """Split ids into as few simple/price calls as the batch size and URL length allow."""
+        base_length = len(self._price_url([]))
+        chunks, chunk, length = [], [], base_length
+
+        for coin_id in coin_ids:
+            extra = len(coin_id) + (1 if chunk else 0)
+            if chunk and (len(chunk) >= PRICE_BATCH_SIZE or length + extra > PRICE_BATCH_MAX_URL_LENGTH):
+                chunks.append(chunk)
+                chunk, length, extra = [], base_length, len(coin_id)
+            chunk.append(coin_id)
+            length += extra
+
+        if chunk:
+            chunks.append(chunk)
+        return chunks
+
+    async def _fetch_price_chunk(self, coin_ids: list[str], priority: int) -> dict[str, float]:
+        async with self._price_batch_semaphore:
+            # Background polling can wait, only interactive reads are hedged
+            return await self.price_hedger.fetch(coin_ids, priority, hedge=priority == PRIORITY_INTERACTIVE)
+
+    async def _fetch_prices(self, coin_ids: list[str], priority: int = PRIORITY_INTERACTIVE) -> dict[str, float]:
+        """Fetch USD prices of the given ids, sharing any fetch already in flight for the same ids."""
+        return await self.price_flight.fetch_many(coin_ids, partial(self._fetch_prices_upstream, priority=priority))
+
+    async def _fetch_prices_upstream(self, coin_ids: list[str], priority: int) -> dict[str, float]:
+        """Fetch USD prices of the given ids with batched simple/price calls and remember them."""
+        prices = {}
+        chunks = self._chunk_coin_ids(coin_ids)
+        for result in await asyncio.gather(*(self._fetch_price_chunk(chunk, priority) for chunk in chunks)):
+            prices.update(result)
+
+        fetched_at = time.time()
+        self.price_store.update(prices, fetched_at)
+        self.broadcaster.publish(prices, fetched_at)
+        return prices
+
+    async def _get_prices(self, coin_ids: list[str]) -> dict[str, float]:
+        """
+        Answer from memory and only go upstream for cold ids.
+        Prices older than PRICE_MAX_AGE are still served up to PRICE_STALE_TTL while
+        they are refreshed in the background, so an upstream outage or an open circuit
+        does not turn into missing prices. Ids that could not be fetched are left out.
+        """
+        self.hot_set.touch(coin_ids)
+
+        prices, stale_ids, cold_ids = {}, [], []
+        for coin_id in dict.fromkeys(coin_ids):
+            entry = self.price_store.get(coin_id)
+            if entry and entry[1] <= PRICE_STALE_TTL:
+                prices[coin_id] = entry[0]
+                if entry[1] > PRICE_MAX_AGE:
+                    stale_ids.append(coin_id)
+            else:
+                cold_ids.append(coin_id)
+
+        self.memory_hits += len(prices) - len(stale_ids)
+        self.stale_hits += len(stale_ids)
+        self.cold_fetches += len(cold_ids)
+        PRICE_CACHE_LOOKUPS.labels("hit").inc(len(prices) - len(stale_ids))
+        PRICE_CACHE_LOOKUPS.labels("stale").inc(len(stale_ids))
+        PRICE_CACHE_LOOKUPS.labels("miss").inc(len(cold_ids))
+
+        if stale_ids:
+            self._revalidate(stale_ids)
+        if cold_ids:
+            try:
+                prices.update(await self._fetch_prices(cold_ids))
+            except Exception as e:
+                logger.error(f"Prices of {cold_ids} could not be fetched: {e}")
+        return prices
+
+    def _revalidate(self, coin_ids: list[str]):
+        """Refresh stale prices without making the caller wait."""
+        async def refresh():
+            try:
+                await self._fetch_prices(coin_ids)
+            except Exception as e:
+                logger.warning(f"Background refresh of {coin_ids} failed: {e}")
+
+        task = asyncio.create_task(refresh())
+        self._revalidations.add(task)
+        task.add_done_callback(self._revalidations.discard)
+
+    async def refresh_hot_prices(self):
+        """Refresh every hot and pinned coin id in batched upstream calls."""
+        coin_ids = self.hot_set.members()
+        coin_ids += [self.coin_index.resolve(symbol) for symbol in self.hot_set.pinned_symbols]
+        coin_ids += self.broadcaster.coin_ids()
+        coin_ids = [coin_id for coin_id in dict.fromkeys(coin_ids) if coin_id]
+
+        if coin_ids:
+            await self._fetch_prices(coin_ids, PRIORITY_BACKGROUND)
+
+    async def _poll_hot_prices_periodically(self):
+        while True:
+            try:
+                await self.refresh_hot_prices()
+            except Exception as e:
+                logger.error(f"Hot price refresh failed: {e}")
+            await asyncio.sleep(PRICE_POLL_INTERVAL)
+
+    async def resolve_stream_symbols(self, coin_symbols: list[str]) -> dict[str, list[str]]:
+        """
+        Validate the coins of a price stream and load their prices, returning the symbols
+        by CoinGecko ID. Nothing is subscribed yet, the stream subscribes once it starts.
+        """
+        symbols = list(dict.fromkeys(coin_symbols))
+        try:
+            self.broadcaster.check_limits(len(symbols))
+        except SubscriptionLimitError as e:
+            raise HTTPException(status_code=429, detail=str(e))
+
+        validations = await asyncio.gather(*(self.validate_coin_symbol(symbol) for symbol in symbols))
+
+        unknown = {symbol: result for symbol, (success, result) in zip(symbols, validations) if not success}
+        if unknown:
+            raise HTTPException(status_code=400, detail=unknown)
+
+        symbols_by_id = {}
+        for symbol, (_, coin_id) in zip(symbols, validations):
+            symbols_by_id.setdefault(coin_id, []).append(symbol)
+
+        try:
+            await self._get_prices(list(symbols_by_id))
+        except Exception as e:
+            logger.error(f"Initial prices of a stream subscription failed: {e}")
+        return symbols_by_id
+
+    def subscribe_prices(self, symbols_by_id: dict[str, list[str]]) -> Subscription:
+        """
+        Subscribe to price updates of the given coins, starting with the prices in memory.
+        Raises SubscriptionLimitError if the streams filled up since the symbols were resolved.
+        """
+        subscription = self.broadcaster.subscribe(symbols_by_id)
+        for coin_id in symbols_by_id:
+            entry = self.price_store.prices.get(coin_id)
+            if entry:
+                subscription.push(coin_id, *entry)
+        return subscription
+
+    async def _sync_history(self, coin_id: str, granularity: str):
+        """Fetch only the samples missing after the stored tail of a price series."""
+        checked_at = self._history_checked_at.get((coin_id, granularity))
+        if checked_at and time.monotonic() - checked_at < HISTORY_RECHECK_SECONDS:
+            return
+
+        config = GRANULARITIES[granularity]
+        last_timestamp = await asyncio.to_thread(self.history.last_timestamp, coin_id, granularity)
+        now_ms = int(time.time() * 1000)
+
+        if last_timestamp is None:
+            days = config["max_days"]
+        elif now_ms - last_timestamp <= config["step"]:
+            days = 0  # No completed sample after the stored one yet
+        else:
+            days = min(config["max_days"], math.ceil((now_ms - last_timestamp) / DAY_MS) + 1)
+
+        if days:
+            url = f"{FETCH_SOURCE}api/v3/coins/{coin_id}/market_chart?vs_currency=usd"
+            if granularity == "daily":
+                url += f"&days={days}&interval=daily"
+            else:
+                # Ranges under two days come back in 5 minute samples instead of hourly ones
+                url += f"&days={max(days, 2)}"
+            data = await self._get_json(url)
+
+            # The last sample is the live price, not a completed one, so it is not stored
+            samples = data.get("prices", [])[:-1]
+            records = np.array([(int(ts), price) for ts, price in samples if price is not None], dtype=RECORD)
+            await asyncio.to_thread(self.history.append, coin_id, granularity, records)
+
+        self._history_checked_at[(coin_id, granularity)] = time.monotonic()
+
+    async def get_coin_history(self, coin_symbol: str, days: int, interval: str):
+        """Get OHLC candles of a coin for the last days, syncing the local store first."""
+        try:
+            success, coin_id = await self.validate_coin_symbol(coin_symbol)
+            if not success:
+                return False, coin_id
+
+            granularity, step = INTERVALS[interval]
+
+            async def sync(keys: list[tuple[str, str]]) -> dict:
+                await self._sync_history(coin_id, granularity)
+                return {}
+
+            await self.history_flight.fetch_many([(coin_id, granularity)], sync)
+
+            records = await asyncio.to_thread(self.history.read, coin_id, granularity)
+            now_ms = int(time.time() * 1000)
+            selected = slice_range(records, now_ms - days * DAY_MS, now_ms)
+            return True, resample_ohlc(selected, step)
+
+        except HTTPException:
+            raise
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=str(e))
+
+    def price_meta(self, coin_symbols: list[str]) -> dict[str, dict]:
+        """
+        Seconds since the price of each symbol was fetched and whether it is older than
+        PRICE_MAX_AGE, the age is None if the price is not in memory.
+        """
+        meta = {}
+        for symbol in coin_symbols:
+            coin_id = self.coin_index.resolve(symbol)
+            entry = self.price_store.get(coin_id) if coin_id else None
+            age = round(entry[1], 3) if entry else None
+            meta[symbol] = {"age": age, "stale": age is not None and age > PRICE_MAX_AGE}
+        return meta
+
     async def get_coin_price(self, coin_symbol: str):
         """Get the current price of a coin."""
         try:
@@ -110,26 +647,41 @@ class CoinGeckoAPI:
             if not success:
                 return False, coin_id
 
-            await self._wait_for_rate_limit()
-            url = f"{FETCH_SOURCE}api/v3/simple/price?ids={coin_id}&vs_currencies=usd"
+            prices = await self._get_prices([coin_id])
 
-            async with aiohttp.ClientSession() as session:
-                async with session.get(url, headers=self.headers) as response:
-                    response.raise_for_status()
-                    data = await response.json()
-
-            if coin_id in data:
-                return True, data[coin_id]["usd"]
+            if coin_id in prices:
+                return True, prices[coin_id]
             return False, "Price data not available."
 
+        except HTTPException:
+            raise
         except Exception as e:
             raise HTTPException(status_code=500, detail=str(e))
 
     async def get_multiple_prices(self, coin_symbols: list[str]):
-        """Fetch prices for multiple coins in parallel."""
+        """Fetch prices for multiple coins with as few upstream calls as possible."""
         try:
-            tasks = [self.get_coin_price(symbol) for symbol in coin_symbols]
-            results = await asyncio.gather(*tasks)
-            return dict(zip(coin_symbols, results))
+            symbols = list(dict.fromkeys(coin_symbols))
+            validations = await asyncio.gather(*(self.validate_coin_symbol(symbol) for symbol in symbols))
+
+            results, coin_ids = {}, {}
+            for symbol, (success, result) in zip(symbols, validations):
+                if success:
+                    coin_ids[symbol] = result
+                else:
+                    results[symbol] = (False, result)
+
+            prices = await self._get_prices(list(coin_ids.values()))
+
+            for symbol, coin_id in coin_ids.items():
+                if coin_id in prices:
+                    results[symbol] = (True, prices[coin_id])
+                else:
+                    results[symbol] = (False, "Price data not available.")
+
+            return {symbol: results[symbol] for symbol in symbols}
+
+        except HTTPException:
+            raise
         except Exception as e:
             raise HTTPException(status_code=500, detail=str(e))
@@ -0,0 +1,39 @@
+import msgpack
+from fastapi import Request
+from fastapi.responses import ORJSONResponse, Response
+
+MSGPACK_MEDIA_TYPE = "application/msgpack"
+MSGPACK_MEDIA_TYPES = {MSGPACK_MEDIA_TYPE, "application/x-msgpack", "application/vnd.msgpack"}
+
+
+def wants_msgpack(request: Request) -> bool:
+    """True if the Accept header names MessagePack before any JSON type."""
+    for media_range in request.headers.get("accept", "").split(","):
+        media_type = media_range.split(";")[0].strip().lower()
+        if media_type in MSGPACK_MEDIA_TYPES:
+            return True
+        if media_type in ("application/json", "*/*"):
+            return False
+    return False
+
+
+def price_string(price: float) -> str:
+    """
+    The shortest decimal that reads back as the same float, which is the number the
+    upstream sent, so Decimal(price_string(p)) carries no binary float noise.
+    """
+    return repr(float(price))
+
+
+def negotiated_prices(request: Request, results: dict, meta: dict) -> Response:
+    """
+    Encode /multiple_prices as MessagePack with decimal string prices when the client asks for it,
+    or as JSON with the usual float prices otherwise.
+    """
+    if wants_msgpack(request):
+        data = {symbol: [success, price_string(value) if success else value]
+                for symbol, (success, value) in results.items()}
+        body = msgpack.packb({"data": data, "meta": meta})
+        return Response(content=body, media_type=MSGPACK_MEDIA_TYPE, headers={"Vary": "Accept"})
+
+    return ORJSONResponse({"data": results, "meta": meta}, headers={"Vary": "Accept"})
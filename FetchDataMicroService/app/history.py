@@ -0,0 +1,106 @@
+import os
+import fcntl
+from typing import Optional
+
+import numpy as np
+from dotenv import load_dotenv
+
+load_dotenv()
+
+HISTORY_DIR = os.getenv("HISTORY_DIR", "data/history")
+
+# One record per upstream sample, timestamps in milliseconds like the upstream API
+RECORD = np.dtype([("ts", "<i8"), ("price", "<f8")])
+
+HOUR_MS = 60 * 60 * 1000
+DAY_MS = 24 * HOUR_MS
+
+# Stored series and the longest range the upstream returns for each of them
+GRANULARITIES = {
+    "hourly": {"step": HOUR_MS, "max_days": 90},
+    "daily": {"step": DAY_MS, "max_days": int(os.getenv("HISTORY_MAX_DAYS", 365))},
+}
+
+# Chart intervals and the stored series they are resampled from
+INTERVALS = {
+    "1h": ("hourly", HOUR_MS),
+    "4h": ("hourly", 4 * HOUR_MS),
+    "1d": ("daily", DAY_MS),
+    "1w": ("daily", 7 * DAY_MS),
+}
+
+
+class PriceHistoryStore:
+    """
+    Append-only price series, one file of fixed size records per coin and granularity.
+    Files are read through memory maps, so range queries only touch the pages they slice.
+    """
+
+    def __init__(self, directory: str = HISTORY_DIR):
+        self.directory = directory
+
+    def _path(self, coin_id: str, granularity: str) -> str:
+        return os.path.join(self.directory, granularity, f"{coin_id}.bin")
+
+    def read(self, coin_id: str, granularity: str) -> np.ndarray:
+        path = self._path(coin_id, granularity)
+        try:
+            count = os.path.getsize(path) // RECORD.itemsize
+        except OSError:
+            count = 0
+        if not count:
+            return np.empty(0, dtype=RECORD)
+        # Ignore a partially written trailing record
+        return np.memmap(path, dtype=RECORD, mode="r", shape=(count,))
+
+    def last_timestamp(self, coin_id: str, granularity: str) -> Optional[int]:
+        records = self.read(coin_id, granularity)
+        return int(records["ts"][-1]) if len(records) else None
+
+    def append(self, coin_id: str, granularity: str, records: np.ndarray) -> int:
+        """Append the records newer than the stored tail and return how many were written."""
+        path = self._path(coin_id, granularity)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        with open(path, "a+b") as file:
+            # Several workers share the directory, re-read the tail under the lock
+            fcntl.flock(file, fcntl.LOCK_EX)
+            try:
+                size = os.fstat(file.fileno()).st_size
+                count = size // RECORD.itemsize
+                if size != count * RECORD.itemsize:
+                    file.truncate(count * RECORD.itemsize)
+
+                if count:
+                    tail = os.pread(file.fileno(), RECORD.itemsize, (count - 1) * RECORD.itemsize)
+                    records = records[records["ts"] > np.frombuffer(tail, dtype=RECORD)["ts"][0]]
+
+                file.write(np.sort(records, order="ts").tobytes())
+                return len(records)
+            finally:
+                fcntl.flock(file, fcntl.LOCK_UN)
+
+
+def slice_range(records: np.ndarray, start_ms: int, end_ms: int) -> np.ndarray:
+    timestamps = records["ts"]
+    return records[np.searchsorted(timestamps, start_ms, "left"):np.searchsorted(timestamps, end_ms, "right")]
+
+
+def resample_ohlc(records: np.ndarray, step_ms: int) -> list[list]:
+    """Group samples into step_ms buckets and return [timestamp, open, high, low, close] rows."""
+    if not len(records):
+        return []
+
+    prices = np.asarray(records["price"])
+    buckets = np.asarray(records["ts"]) // step_ms
+    starts = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+    ends = np.r_[starts[1:], len(prices)]
+
+    candles = np.column_stack((
+        buckets[starts] * step_ms,
+        prices[starts],
+        np.maximum.reduceat(prices, starts),
+        np.minimum.reduceat(prices, starts),
+        prices[ends - 1],
+    ))
+    return [[int(row[0]), *row[1:].tolist()] for row in candles]
@@ -0,0 +1,59 @@
+import os
+import re
+import hashlib
+from io import BytesIO
+from typing import Optional
+
+from PIL import Image
+from dotenv import load_dotenv
+
+load_dotenv()
+
+ICON_SIZES = [int(size) for size in os.getenv("ICON_SIZES", "32,64,128").split(",")]
+ICON_FORMATS = {"png": "image/png", "webp": "image/webp"}
+ICON_WEBP_QUALITY = int(os.getenv("ICON_WEBP_QUALITY", 80))
+
+# Variant keys are content hashed, so a stored variant never changes and may be cached forever.
+# Bump the version when the rendering changes to publish new keys.
+ICON_VARIANT_VERSION = "v1"
+ICON_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+_VARIANT_KEY = re.compile(rf"^icons/{ICON_VARIANT_VERSION}/(?P<coin>[^/]+)/(?P<size>\d+)-[0-9a-f]+\.(?P<format>\w+)$")
+
+
+def variant_prefix(coin: str) -> str:
+    return f"icons/{ICON_VARIANT_VERSION}/{coin}/"
+
+
+def variant_key(coin: str, size: int, image_format: str, data: bytes) -> str:
+    digest = hashlib.sha256(data).hexdigest()[:16]
+    return f"{variant_prefix(coin)}{size}-{digest}.{image_format}"
+
+
+def parse_variant_key(key: str) -> Optional[tuple[str, int, str]]:
+    """Return (coin, size, format) of a variant key, None for any other key."""
+    match = _VARIANT_KEY.match(key)
+    if not match:
+        return None
+    return match["coin"], int(match["size"]), match["format"]
+
+
+def render_variants(image_data: bytes) -> dict[tuple[int, str], bytes]:
+    """Resize an icon to every configured size and encode it in every configured format."""
+    variants = {}
+    with Image.open(BytesIO(image_data)) as image:
+        image = image.convert("RGBA")
+
+        for size in ICON_SIZES:
+            resized = image.copy()
+            resized.thumbnail((size, size), Image.Resampling.LANCZOS)
+
+            for image_format in ICON_FORMATS:
+                buffer = BytesIO()
+                if image_format == "webp":
+                    resized.save(buffer, "WEBP", quality=ICON_WEBP_QUALITY, method=6)
+                else:
+                    resized.save(buffer, "PNG", optimize=True)
+                variants[(size, image_format)] = buffer.getvalue()
+
+    return variants
@@ -1,8 +1,22 @@
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
-from .api import router  # Changed from 'app.api'
+from fastapi.responses import ORJSONResponse
+from .api import router, api  # Changed from 'app.api'
+from .metrics import MetricsMiddleware
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Open the shared upstream connection pool for the lifetime of the worker."""
+    await api.start()
+    yield
+    await api.close()
+
 
-app = FastAPI(title="Coin Data Microservice")
+app = FastAPI(title="Coin Data Microservice", lifespan=lifespan, default_response_class=ORJSONResponse)
 app.include_router(router)
+app.add_middleware(MetricsMiddleware)
 
 @app.get("/")
 async def root():
@@ -0,0 +1,98 @@
+import os
+import time
+from urllib.parse import urlsplit
+
+from prometheus_client import (CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge, Histogram,
+                               generate_latest, multiprocess)
+
+# Latency buckets in seconds, from a cache answer up to the upstream timeout
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+# The limiter spaces requests 500 ms apart, and a 429 blocks it for up to RATE_LIMIT_MAX_RETRY_AFTER
+WAIT_BUCKETS = (0.001, 0.1, 0.25, 0.5, 1, 2, 5, 10, 30, 60)
+
+UPSTREAM_LATENCY = Histogram(
+    "upstream_request_seconds", "Latency of upstream HTTP requests", ["endpoint"], buckets=LATENCY_BUCKETS)
+UPSTREAM_RESPONSES = Counter(
+    "upstream_responses_total", "Upstream responses by status, error when no status was received",
+    ["endpoint", "status"])
+UPSTREAM_IN_FLIGHT = Gauge(
+    "upstream_requests_in_flight", "Upstream HTTP requests currently open", multiprocess_mode="livesum")
+
+RATE_LIMIT_WAIT = Histogram(
+    "rate_limiter_wait_seconds", "Time spent waiting for an upstream token", ["lane"], buckets=WAIT_BUCKETS)
+RATE_LIMIT_QUEUE_DEPTH = Gauge(
+    "rate_limiter_queue_depth", "Requests waiting for an upstream token", ["lane"], multiprocess_mode="livesum")
+RATE_LIMIT_THROTTLED = Counter(
+    "rate_limiter_throttled_total", "Times the upstream answered 429 and the limiter backed off")
+
+PRICE_PROVIDER_LATENCY = Histogram(
+    "price_provider_seconds", "Latency of successful price provider calls", ["provider"], buckets=LATENCY_BUCKETS)
+PRICE_PROVIDER_WINS = Counter(
+    "price_provider_wins_total", "Hedged price fetches answered first by each provider", ["provider"])
+PRICE_HEDGES = Counter(
+    "price_hedges_total", "Hedge requests sent because the primary provider was slow")
+
+PRICE_CACHE_LOOKUPS = Counter(
+    "price_cache_lookups_total", "In-memory price lookups by result: hit, stale or miss", ["result"])
+COALESCED_KEYS = Counter(
+    "singleflight_keys_total", "Keys asked from a single flight, coalesced when joining an in-flight fetch",
+    ["flight", "outcome"])
+
+MINIO_LATENCY = Histogram(
+    "minio_operation_seconds", "Latency of MinIO operations", ["operation"], buckets=LATENCY_BUCKETS)
+
+HTTP_LATENCY = Histogram(
+    "http_request_seconds", "Latency of requests served by this service", ["route"], buckets=LATENCY_BUCKETS)
+HTTP_IN_FLIGHT = Gauge(
+    "http_requests_in_flight", "Requests currently being served, open price streams included",
+    multiprocess_mode="livesum")
+
+
+def upstream_endpoint(url: str) -> str:
+    """Low cardinality label of an upstream URL, coin ids are replaced by {id}."""
+    path = urlsplit(url).path
+    if "/api/v3/" not in path:
+        return "icon"
+
+    parts = path.split("/api/v3/", 1)[1].strip("/").split("/")
+    if parts[0] == "coins" and len(parts) > 1 and parts[1] not in ("list", "markets"):
+        parts[1] = "{id}"
+    return "/".join(parts)
+
+
+class MetricsMiddleware:
+    """
+    Plain ASGI middleware counting requests in flight and timing them per route template,
+    so /coin_price/btc and /coin_price/eth share a label. A price stream stays in flight
+    until the client disconnects.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        with HTTP_IN_FLIGHT.track_inprogress():
+            try:
+                await self.app(scope, receive, send)
+            finally:
+                # The router stores the matched route in the shared scope
+                route = scope.get("route")
+                HTTP_LATENCY.labels(route.path if route else "unmatched").observe(time.perf_counter() - started)
+
+
+def render() -> tuple[bytes, str]:
+    """
+    Encode every metric in the Prometheus text format.
+    Under gunicorn PROMETHEUS_MULTIPROC_DIR is set and the files of all workers are merged.
+    """
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
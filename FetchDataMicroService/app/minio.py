@@ -1,10 +1,17 @@
 import os
+import time
+import asyncio
+import logging
+from contextlib import AsyncExitStack
 from typing import Optional
 
 import botocore.exceptions
 from aiobotocore.session import AioSession
 from dotenv import load_dotenv
 
+from .icons import ICON_FORMATS, ICON_CACHE_CONTROL, parse_variant_key, variant_key, variant_prefix
+from .metrics import MINIO_LATENCY
+
 load_dotenv()
 
 MINIO_ENDPOINT = os.getenv("MINIO_ENDPOINT")
@@ -12,12 +19,25 @@ MINIO_BUCKET = os.getenv("MINIO_BUCKET")
 MINIO_ACCESS_KEY = os.getenv("MINIO_ACCESS_KEY")
 MINIO_SECRET_KEY = os.getenv("MINIO_SECRET_KEY")
 
+logger = logging.getLogger(__name__)
+
 
 class MinioClient:
     """Handles interactions with MinIO to check, upload, and retrieve icons."""
 
     def __init__(self):
         self.session = AioSession()
+        self.client = None
+        self._exit_stack: Optional[AsyncExitStack] = None
+
+        # Keys known to exist in the bucket, so existence checks need no round-trip.
+        # Once the listing has loaded it is authoritative, a missing key is not looked up again.
+        self.keys: set[str] = set()
+        self.variant_keys: dict[tuple[str, int, str], str] = {}
+        self.index_ready = False
+        self.index_load_seconds: Optional[float] = None
+        self.index_hits = 0
+        self.index_misses = 0
 
     def _get_client(self):
         # Create a client context manager without awaiting
@@ -30,19 +50,145 @@ class MinioClient:
             region_name="us-east-1"
         )
 
+    async def start(self):
+        """Open the long-lived S3 client and index the bucket, called once from the app lifespan."""
+        if self.client:
+            return
+        self._exit_stack = AsyncExitStack()
+        self.client = await self._exit_stack.enter_async_context(self._get_client())
+        await self.load_index()
+
+    async def close(self):
+        if self._exit_stack:
+            await self._exit_stack.aclose()
+        self._exit_stack = None
+        self.client = None
+
+    async def _get(self):
+        if not self.client:
+            await self.start()
+        return self.client
+
+    async def load_index(self):
+        """List the whole bucket page by page and remember every stored key."""
+        started = time.monotonic()
+        client = await self._get()
+
+        try:
+            keys = await self._list_keys(client)
+        except Exception as e:
+            logger.error(f"Listing bucket {MINIO_BUCKET} failed, icon checks fall back to head_object: {e}")
+            return
+
+        for key in keys:
+            self._remember(key)
+        self.index_ready = True
+        self.index_load_seconds = time.monotonic() - started
+        logger.info(f"Indexed {len(keys)} objects of bucket {MINIO_BUCKET} in {self.index_load_seconds:.3f}s")
+
+    @staticmethod
+    async def _list_keys(client, prefix: str = "") -> list[str]:
+        keys = []
+        paginator = client.get_paginator("list_objects_v2")
+        with MINIO_LATENCY.labels("list_objects").time():
+            async for page in paginator.paginate(Bucket=MINIO_BUCKET, Prefix=prefix):
+                keys.extend(item["Key"] for item in page.get("Contents", []))
+        return keys
+
+    def _remember(self, key: str):
+        self.keys.add(key)
+        variant = parse_variant_key(key)
+        if variant:
+            self.variant_keys[variant] = key
+
+    async def _object_exists(self, key: str) -> bool:
+        if key in self.keys:
+            self.index_hits += 1
+            return True
+        self.index_misses += 1
+        if self.index_ready:
+            # The listing plus our own uploads, a miss means the key is not stored
+            return False
+
+        # Without an index the bucket has to be asked
+        client = await self._get()
+        try:
+            with MINIO_LATENCY.labels("head_object").time():
+                await client.head_object(Bucket=MINIO_BUCKET, Key=key)
+        except botocore.exceptions.ClientError as e:
+            if e.response["Error"]["Code"] == "404":
+                return False
+            raise
+
+        self._remember(key)
+        return True
+
     async def icon_exists(self, coin: str) -> Optional[str]:
         """Check if icon already exists in MinIO, return its URL if found."""
-        async with self._get_client() as client:
-            try:
-                await client.head_object(Bucket=MINIO_BUCKET, Key=f"{coin}.png")
-                return f"/{MINIO_BUCKET}/{coin}.png"
-            except botocore.exceptions.ClientError as e:
-                if e.response["Error"]["Code"] == "404":
-                    return None
-                raise
+        if await self._object_exists(f"{coin}.png"):
+            return f"/{MINIO_BUCKET}/{coin}.png"
+        return None
+
+    def known_icon_url(self, coin: str, size: Optional[int], image_format: str) -> Optional[str]:
+        """Return the URL of a stored icon if the index knows it, without any network I/O."""
+        key = f"{coin}.png" if size is None else self.variant_keys.get((coin, size, image_format))
+        if key and key in self.keys:
+            return f"/{MINIO_BUCKET}/{key}"
+        return None
 
     async def upload_icon(self, coin: str, image_data: bytes) -> str:
         """Upload icon to MinIO and return its public URL."""
-        async with self._get_client() as client:
+        client = await self._get()
+        with MINIO_LATENCY.labels("put_object").time():
             await client.put_object(Bucket=MINIO_BUCKET, Key=f"{coin}.png", Body=image_data, ContentType="image/png")
-        return f"/{MINIO_BUCKET}/{coin}.png"
\ No newline at end of file
+        self._remember(f"{coin}.png")
+        return f"/{MINIO_BUCKET}/{coin}.png"
+
+    async def download_icon(self, coin: str) -> bytes:
+        """Read the original icon of a coin back from MinIO."""
+        client = await self._get()
+        with MINIO_LATENCY.labels("get_object").time():
+            response = await client.get_object(Bucket=MINIO_BUCKET, Key=f"{coin}.png")
+            async with response["Body"] as stream:
+                return await stream.read()
+
+    async def icon_variant_url(self, coin: str, size: int, image_format: str) -> Optional[str]:
+        """Return the URL of a resized icon variant if it is stored."""
+        key = self.variant_keys.get((coin, size, image_format))
+        if key:
+            self.index_hits += 1
+            return f"/{MINIO_BUCKET}/{key}"
+        self.index_misses += 1
+        if self.index_ready:
+            return None
+
+        # Without an index the bucket has to be listed
+        client = await self._get()
+        for key in await self._list_keys(client, variant_prefix(coin)):
+            self._remember(key)
+
+        key = self.variant_keys.get((coin, size, image_format))
+        return f"/{MINIO_BUCKET}/{key}" if key else None
+
+    async def upload_icon_variants(self, coin: str, variants: dict[tuple[int, str], bytes]):
+        """Upload resized icons under content hashed keys that clients may cache forever."""
+        client = await self._get()
+
+        async def upload(size: int, image_format: str, data: bytes):
+            key = variant_key(coin, size, image_format, data)
+            with MINIO_LATENCY.labels("put_object").time():
+                await client.put_object(Bucket=MINIO_BUCKET, Key=key, Body=data,
+                                        ContentType=ICON_FORMATS[image_format], CacheControl=ICON_CACHE_CONTROL)
+            self._remember(key)
+
+        await asyncio.gather(*(upload(size, image_format, data) for (size, image_format), data in variants.items()))
+
+    def stats(self) -> dict:
+        return {
+            "ready": self.index_ready,
+            "keys": len(self.keys),
+            "variants": len(self.variant_keys),
+            "load_seconds": round(self.index_load_seconds, 3) if self.index_load_seconds is not None else None,
+            "hits": self.index_hits,
+            "misses": self.index_misses,
+        }
@@ -0,0 +1,63 @@
+import time
+from typing import Iterable, Optional
+
+# Scores below this are forgotten, about seven half-lives after the last request
+MIN_HOT_SCORE = 0.01
+
+
+class PriceStore:
+    """Last fetched USD price of each coin id together with the time it was fetched."""
+
+    def __init__(self):
+        self.prices: dict[str, tuple[float, float]] = {}
+
+    def update(self, prices: dict[str, float], fetched_at: Optional[float] = None):
+        fetched_at = fetched_at or time.time()
+        for coin_id, price in prices.items():
+            self.prices[coin_id] = (price, fetched_at)
+
+    def get(self, coin_id: str) -> Optional[tuple[float, float]]:
+        """Return the last known (price, age in seconds) of a coin id."""
+        entry = self.prices.get(coin_id)
+        if entry:
+            return entry[0], time.time() - entry[1]
+        return None
+
+
+class HotSet:
+    """
+    Coin ids that were requested recently, scored with exponential decay so
+    ids nobody asks for anymore drop out, plus pinned symbols from the config.
+    """
+
+    def __init__(self, half_life: float, max_size: int, pinned_symbols: Iterable[str] = ()):
+        self.half_life = half_life
+        self.max_size = max_size
+        self.pinned_symbols = {symbol.lower() for symbol in pinned_symbols if symbol}
+        self.scores: dict[str, tuple[float, float]] = {}
+
+    def _decayed(self, score: float, updated_at: float, now: float) -> float:
+        return score * 0.5 ** ((now - updated_at) / self.half_life)
+
+    def touch(self, coin_ids: Iterable[str]):
+        now = time.monotonic()
+        for coin_id in coin_ids:
+            score, updated_at = self.scores.get(coin_id, (0.0, now))
+            self.scores[coin_id] = (self._decayed(score, updated_at, now) + 1, now)
+
+    def members(self) -> list[str]:
+        """Hottest ids first, at most max_size of them."""
+        now = time.monotonic()
+        decayed = {coin_id: self._decayed(score, updated_at, now)
+                   for coin_id, (score, updated_at) in self.scores.items()}
+
+        for coin_id, score in decayed.items():
+            if score < MIN_HOT_SCORE:
+                del self.scores[coin_id]
+
+        hot = sorted((coin_id for coin_id, score in decayed.items() if score >= MIN_HOT_SCORE),
+                     key=decayed.get, reverse=True)
+        return hot[:self.max_size]
+
+    def stats(self) -> dict:
+        return {"tracked": len(self.scores), "pinned": len(self.pinned_symbols), "max_size": self.max_size}
@@ -0,0 +1,93 @@
+import asyncio
+
+
+class SubscriptionLimitError(Exception):
+    pass
+
+
+class Subscription:
+    """
+    Price updates waiting to be sent to one streaming client.
+    Only the latest update per symbol is kept, so a slow consumer gets
+    coalesced updates instead of an ever growing backlog.
+    """
+
+    def __init__(self, symbols_by_id: dict[str, list[str]]):
+        self.symbols_by_id = symbols_by_id
+        self.pending: dict[str, tuple[float, float]] = {}
+        self.coalesced = 0
+        self.closed = False
+        self._event = asyncio.Event()
+
+    def push(self, coin_id: str, price: float, fetched_at: float):
+        for symbol in self.symbols_by_id.get(coin_id, ()):
+            if symbol in self.pending:
+                self.coalesced += 1
+            self.pending[symbol] = (price, fetched_at)
+        self._event.set()
+
+    async def next_updates(self, timeout: float) -> dict[str, tuple[float, float]]:
+        """Wait up to timeout seconds for updates and take all of them."""
+        try:
+            await asyncio.wait_for(self._event.wait(), timeout)
+        except asyncio.TimeoutError:
+            return {}
+
+        updates, self.pending = self.pending, {}
+        self._event.clear()
+        return updates
+
+
+class PriceBroadcaster:
+    """Fans refreshed prices out to the streaming subscriptions interested in them."""
+
+    def __init__(self, max_subscriptions: int, max_symbols: int):
+        self.max_subscriptions = max_subscriptions
+        self.max_symbols = max_symbols
+        self.subscriptions: dict[str, set[Subscription]] = {}
+        self.count = 0
+        self.published = 0
+
+    def check_limits(self, symbol_count: int):
+        if self.count >= self.max_subscriptions:
+            raise SubscriptionLimitError("Too many price stream subscriptions, try again later.")
+        if symbol_count > self.max_symbols:
+            raise SubscriptionLimitError(f"A price stream can follow at most {self.max_symbols} coins.")
+
+    def subscribe(self, symbols_by_id: dict[str, list[str]]) -> Subscription:
+        self.check_limits(sum(len(symbols) for symbols in symbols_by_id.values()))
+
+        subscription = Subscription(symbols_by_id)
+        for coin_id in symbols_by_id:
+            self.subscriptions.setdefault(coin_id, set()).add(subscription)
+        self.count += 1
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        if subscription.closed:
+            return
+        subscription.closed = True
+        for coin_id in subscription.symbols_by_id:
+            subscribers = self.subscriptions.get(coin_id)
+            if subscribers is None:
+                continue
+            subscribers.discard(subscription)
+            if not subscribers:
+                del self.subscriptions[coin_id]
+        self.count -= 1
+
+    def publish(self, prices: dict[str, float], fetched_at: float):
+        for coin_id, price in prices.items():
+            for subscription in self.subscriptions.get(coin_id, ()):
+                subscription.push(coin_id, price, fetched_at)
+                self.published += 1
+
+    def coin_ids(self) -> list[str]:
+        return list(self.subscriptions)
+
+    def stats(self) -> dict:
+        return {
+            "subscriptions": self.count,
+            "coins": len(self.subscriptions),
+            "published": self.published,
+        }
@@ -0,0 +1,258 @@
+import os
+import json
+import time
+import asyncio
+import logging
+from collections import deque
+from typing import Optional
+
+from dotenv import load_dotenv
+
+from .circuit_breaker import CircuitBreaker
+from .metrics import PRICE_HEDGES, PRICE_PROVIDER_LATENCY, PRICE_PROVIDER_WINS
+from .rate_limiter import TokenBucketRateLimiter
+
+load_dotenv()
+
+# Ordered price providers, the first one is asked first and the others are hedges
+PRICE_PROVIDERS = [name.strip() for name in os.getenv("PRICE_PROVIDERS", "coingecko").split(",") if name.strip()]
+# JSON file of {"provider": {"coin id": "provider symbol"}} overriding the default mapping
+PRICE_PROVIDER_SYMBOLS = os.getenv("PRICE_PROVIDER_SYMBOLS")
+
+BINANCE_API = os.getenv("BINANCE_API", "https://api.binance.com/")
+BINANCE_QUOTE = os.getenv("BINANCE_QUOTE", "USDT")
+BINANCE_RATE_LIMIT_PER_SECOND = float(os.getenv("BINANCE_RATE_LIMIT_PER_SECOND", 5))
+
+# Send a hedge once the primary is slower than this percentile of its recent latencies
+HEDGE_PERCENTILE = float(os.getenv("HEDGE_PERCENTILE", 0.95))
+HEDGE_MIN_DELAY = float(os.getenv("HEDGE_MIN_DELAY", 0.05))
+HEDGE_DEFAULT_DELAY = float(os.getenv("HEDGE_DEFAULT_DELAY", 1.0))
+HEDGE_MIN_SAMPLES = int(os.getenv("HEDGE_MIN_SAMPLES", 20))
+HEDGE_WINDOW = int(os.getenv("HEDGE_WINDOW", 200))
+
+logger = logging.getLogger(__name__)
+
+
+def load_symbol_overrides(path: Optional[str] = PRICE_PROVIDER_SYMBOLS) -> dict[str, dict[str, str]]:
+    if not path:
+        return {}
+    try:
+        with open(path, encoding="utf-8") as file:
+            return json.load(file)
+    except (OSError, ValueError) as e:
+        logger.error(f"Price provider symbols could not be read from {path}: {e}")
+        return {}
+
+
+class ProviderStats:
+    """Latencies of the last successful calls of a provider, and how often it won a race."""
+
+    def __init__(self, window: int = HEDGE_WINDOW):
+        self.latencies: deque[float] = deque(maxlen=window)
+        self.requests = 0
+        self.failures = 0
+        self.races = 0
+        self.wins = 0
+
+    def percentile(self, fraction: float) -> Optional[float]:
+        if not self.latencies:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+    def as_dict(self) -> dict:
+        latency = {name: round(value, 4) if value is not None else None
+                   for name, value in (("p50", self.percentile(0.5)), ("p95", self.percentile(0.95)),
+                                       ("p99", self.percentile(0.99)))}
+        return {
+            "requests": self.requests,
+            "failures": self.failures,
+            "latency_seconds": latency,
+            "races": self.races,
+            "wins": self.wins,
+            "win_rate": round(self.wins / self.races, 3) if self.races else None,
+        }
+
+
+class PriceProvider:
+    """
+    Source of USD prices keyed by CoinGecko id.
+    Providers that only know some coins map the ids they support and leave the rest out.
+    """
+
+    name = ""
+
+    def __init__(self, api, symbols: Optional[dict[str, str]] = None):
+        self.api = api
+        self.symbols = symbols or {}
+        self.stats = ProviderStats()
+
+    def supports(self, coin_id: str) -> bool:
+        return True
+
+    async def fetch_prices(self, coin_ids: list[str], priority: int) -> dict[str, float]:
+        raise NotImplementedError
+
+    async def timed_fetch(self, coin_ids: list[str], priority: int) -> dict[str, float]:
+        started = time.monotonic()
+        self.stats.requests += 1
+        try:
+            prices = await self.fetch_prices(coin_ids, priority)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            self.stats.failures += 1
+            raise
+
+        elapsed = time.monotonic() - started
+        self.stats.latencies.append(elapsed)
+        PRICE_PROVIDER_LATENCY.labels(self.name).observe(elapsed)
+        return prices
+
+
+class CoinGeckoProvider(PriceProvider):
+    """The simple/price endpoint, shares the rate limiter and circuit breaker of the upstream client."""
+
+    name = "coingecko"
+
+    async def fetch_prices(self, coin_ids: list[str], priority: int) -> dict[str, float]:
+        data = await self.api._get_json(self.api._price_url(coin_ids), priority)
+        return {coin_id: data[coin_id]["usd"] for coin_id in coin_ids if "usd" in data.get(coin_id, {})}
+
+
+class BinanceProvider(PriceProvider):
+    """
+    Spot prices against BINANCE_QUOTE, a USD stablecoin, so they track the USD price closely.
+    Coins map to the <SYMBOL><QUOTE> pair of their index symbol unless overridden.
+    All tickers are fetched in one call and filtered, pairs Binance does not list are left out.
+    """
+
+    name = "binance"
+
+    def __init__(self, api, symbols: Optional[dict[str, str]] = None):
+        super().__init__(api, symbols)
+        self.rate_limiter = TokenBucketRateLimiter(BINANCE_RATE_LIMIT_PER_SECOND, 1)
+        self.breaker = CircuitBreaker(api.breaker.failure_threshold, api.breaker.reset_timeout)
+
+    def pair(self, coin_id: str) -> Optional[str]:
+        if coin_id in self.symbols:
+            return self.symbols[coin_id]
+        symbol = self.api.coin_index.symbol_of(coin_id)
+        if not symbol or symbol.upper() == BINANCE_QUOTE:
+            return None
+        return f"{symbol.upper()}{BINANCE_QUOTE}"
+
+    def supports(self, coin_id: str) -> bool:
+        return self.pair(coin_id) is not None
+
+    async def fetch_prices(self, coin_ids: list[str], priority: int) -> dict[str, float]:
+        tickers = await self.api._get(f"{BINANCE_API}api/v3/ticker/price", priority,
+                                      breaker=self.breaker, rate_limiter=self.rate_limiter)
+        prices = {ticker["symbol"]: float(ticker["price"]) for ticker in tickers}
+
+        result = {}
+        for coin_id in coin_ids:
+            pair = self.pair(coin_id)
+            if pair in prices:
+                result[coin_id] = prices[pair]
+        return result
+
+
+PROVIDER_TYPES = {provider.name: provider for provider in (CoinGeckoProvider, BinanceProvider)}
+
+
+def build_providers(api, names: list[str] = PRICE_PROVIDERS) -> list[PriceProvider]:
+    overrides = load_symbol_overrides()
+    providers = []
+    for name in names:
+        if name not in PROVIDER_TYPES:
+            raise ValueError(f"Unknown price provider '{name}', expected one of {', '.join(PROVIDER_TYPES)}")
+        providers.append(PROVIDER_TYPES[name](api, overrides.get(name)))
+    return providers
+
+
+class HedgedPriceFetcher:
+    """
+    Asks the first provider and, if it is slower than HEDGE_PERCENTILE of its recent
+    latencies, sends the same ids to the next provider too and takes whichever answers first.
+    Ids a winning hedge does not cover are still taken from the primary.
+    """
+
+    def __init__(self, providers: list[PriceProvider]):
+        self.providers = providers
+        self.hedges_sent = 0
+
+    def hedge_delay(self, provider: PriceProvider) -> float:
+        if len(provider.stats.latencies) < HEDGE_MIN_SAMPLES:
+            return HEDGE_DEFAULT_DELAY
+        return max(HEDGE_MIN_DELAY, provider.stats.percentile(HEDGE_PERCENTILE))
+
+    async def fetch(self, coin_ids: list[str], priority: int, hedge: bool = True) -> dict[str, float]:
+        primary = self.providers[0]
+        primary_task = asyncio.create_task(primary.timed_fetch(coin_ids, priority))
+        if not hedge or len(self.providers) < 2:
+            return await primary_task
+
+        try:
+            done, _ = await asyncio.wait({primary_task}, timeout=self.hedge_delay(primary))
+            # A primary failing early, an open breaker say, goes straight to the hedges
+            if done and not primary_task.exception():
+                return primary_task.result()
+        except asyncio.CancelledError:
+            primary_task.cancel()
+            raise
+
+        return await self._race(primary_task, coin_ids, priority)
+
+    async def _race(self, primary_task: asyncio.Task, coin_ids: list[str], priority: int) -> dict[str, float]:
+        primary = self.providers[0]
+        tasks = {primary_task: primary}
+        for provider in self.providers[1:]:
+            supported = [coin_id for coin_id in coin_ids if provider.supports(coin_id)]
+            if supported:
+                tasks[asyncio.create_task(provider.timed_fetch(supported, priority))] = provider
+        if len(tasks) == 1:
+            return await primary_task
+
+        self.hedges_sent += len(tasks) - 1
+        PRICE_HEDGES.inc(len(tasks) - 1)
+        for provider in tasks.values():
+            provider.stats.races += 1
+
+        prices: dict[str, float] = {}
+        pending = set(tasks)
+        winner = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.cancelled() or task.exception():
+                        if task is primary_task:
+                            logger.warning(f"Primary price provider failed, using hedges: {task.exception()}")
+                        continue
+                    # Earlier answers win, later ones only fill ids that are still missing
+                    prices = {**task.result(), **prices}
+                    if winner is None:
+                        winner = tasks[task]
+                primary_answered = primary_task.done() and not primary_task.cancelled() \
+                    and not primary_task.exception()
+                if primary_answered or all(coin_id in prices for coin_id in coin_ids):
+                    break
+        finally:
+            for task in pending:
+                task.cancel()
+
+        if winner is None:
+            # Every provider failed, surface the error of the primary
+            return primary_task.result()
+
+        winner.stats.wins += 1
+        PRICE_PROVIDER_WINS.labels(winner.name).inc()
+        return prices
+
+    def stats(self) -> dict:
+        return {
+            "hedges_sent": self.hedges_sent,
+            "providers": {provider.name: {**provider.stats.as_dict(), "hedge_delay": round(self.hedge_delay(provider), 4)}
+                          for provider in self.providers},
+        }
@@ -0,0 +1,125 @@
+import time
+import asyncio
+from collections import deque
+from typing import Optional
+
+from .metrics import RATE_LIMIT_QUEUE_DEPTH, RATE_LIMIT_THROTTLED, RATE_LIMIT_WAIT
+
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BACKGROUND = 1
+
+
+class TokenBucketRateLimiter:
+    """
+    Async token bucket shared by every upstream call of the process.
+    Waiters are served first-in first-out inside a priority lane, and a lower
+    lane number always goes first, so interactive price reads overtake
+    background icon or catalog work.
+    """
+
+    def __init__(self, rate: float, burst: int, lanes: int = 2):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated_at = time.monotonic()
+        self.blocked_until = 0.0
+        self._lanes = [deque() for _ in range(lanes)]
+        self._dispatcher: Optional[asyncio.Task] = None
+
+        self.acquired = 0
+        self.throttled = 0
+        self.total_wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+
+    @property
+    def queue_depth(self) -> int:
+        return sum(1 for lane in self._lanes for waiter in lane if not waiter.done())
+
+    def _refill(self):
+        now = time.monotonic()
+        if now < self.blocked_until:
+            # No tokens accumulate while the upstream asked us to back off
+            self.updated_at = now
+            return
+        self.tokens = min(self.burst, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    async def acquire(self, priority: int = PRIORITY_INTERACTIVE):
+        """Wait until a request may be sent to the upstream."""
+        started = time.monotonic()
+        self._refill()
+
+        if self.tokens >= 1 and not self.queue_depth:
+            self.tokens -= 1
+            self._record_wait(0.0, priority)
+            return
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._lanes[priority].append(waiter)
+        self._export_queue_depth()
+        if self._dispatcher is None or self._dispatcher.done():
+            self._dispatcher = asyncio.create_task(self._dispatch())
+
+        try:
+            await waiter
+        finally:
+            self._export_queue_depth()
+        self._record_wait(time.monotonic() - started, priority)
+
+    async def _dispatch(self):
+        """Hand out tokens to queued waiters as they become available."""
+        while self.queue_depth:
+            self._refill()
+            now = time.monotonic()
+
+            if now < self.blocked_until:
+                await asyncio.sleep(self.blocked_until - now)
+                continue
+            if self.tokens < 1:
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+                continue
+
+            waiter = self._next_waiter()
+            if waiter is None:
+                break
+            self.tokens -= 1
+            waiter.set_result(None)
+
+    def _next_waiter(self) -> Optional[asyncio.Future]:
+        for lane in self._lanes:
+            while lane:
+                waiter = lane.popleft()
+                if not waiter.done():  # Skip waiters that were cancelled meanwhile
+                    return waiter
+        return None
+
+    def penalize(self, retry_after: float):
+        """Stop handing out tokens for retry_after seconds, used when the upstream answers 429."""
+        self.blocked_until = max(self.blocked_until, time.monotonic() + retry_after)
+        self.tokens = 0.0
+        self.throttled += 1
+        RATE_LIMIT_THROTTLED.inc()
+
+    def _export_queue_depth(self):
+        for lane_number, lane in enumerate(self._lanes):
+            RATE_LIMIT_QUEUE_DEPTH.labels(str(lane_number)).set(sum(1 for waiter in lane if not waiter.done()))
+
+    def _record_wait(self, waited: float, priority: int):
+        RATE_LIMIT_WAIT.labels(str(priority)).observe(waited)
+        self.acquired += 1
+        self.total_wait_seconds += waited
+        self.max_wait_seconds = max(self.max_wait_seconds, waited)
+
+    def stats(self) -> dict:
+        return {
+            "rate": self.rate,
+            "burst": self.burst,
+            "tokens": round(self.tokens, 3),
+            "queue_depth": self.queue_depth,
+            "queue_depth_per_lane": [sum(1 for waiter in lane if not waiter.done()) for lane in self._lanes],
+            "acquired": self.acquired,
+            "throttled": self.throttled,
+            "total_wait_seconds": round(self.total_wait_seconds, 3),
+            "max_wait_seconds": round(self.max_wait_seconds, 3),
+            "blocked_for_seconds": round(max(0.0, self.blocked_until - time.monotonic()), 3),
+        }
@@ -0,0 +1,88 @@
+import asyncio
+from typing import Awaitable, Callable, Hashable, Iterable
+
+from .metrics import COALESCED_KEYS
+
+_MISSING = object()
+
+
+class SingleFlight:
+    """
+    Deduplicates concurrent fetches by key.
+    Callers asking for a key that is already being fetched wait for that
+    in-flight fetch instead of sending their own, so a batch only requests
+    the keys nobody else is fetching and merges into the rest.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._in_flight: dict[Hashable, asyncio.Future] = {}
+        self._tasks: set[asyncio.Task] = set()
+
+        self.requested = 0
+        self.coalesced = 0
+        self.merged_batches = 0
+        self.fetches = 0
+
+    async def fetch_many(self, keys: Iterable[Hashable],
+                         fetch: Callable[[list], Awaitable[dict]]) -> dict:
+        """
+        Return {key: value} for the given keys, calling fetch(missing_keys) only for
+        keys that are not in flight yet. Keys absent from the fetch result are absent
+        from the returned dict too; a failed fetch raises for every caller sharing it.
+        """
+        loop = asyncio.get_running_loop()
+        futures, owned = {}, {}
+
+        for key in dict.fromkeys(keys):
+            self.requested += 1
+            if key in self._in_flight:
+                futures[key] = self._in_flight[key]
+                self.coalesced += 1
+            else:
+                future = loop.create_future()
+                # Mark failures as retrieved, nobody may be waiting for them anymore
+                future.add_done_callback(lambda f: f.cancelled() or f.exception())
+                self._in_flight[key] = futures[key] = owned[key] = future
+
+        if len(owned) < len(futures):
+            self.merged_batches += 1
+        COALESCED_KEYS.labels(self.name, "requested").inc(len(futures))
+        COALESCED_KEYS.labels(self.name, "coalesced").inc(len(futures) - len(owned))
+
+        if owned:
+            # Run detached so a disconnecting caller does not cancel a fetch others wait for
+            self.fetches += 1
+            task = asyncio.create_task(self._run(owned, fetch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+        values = await asyncio.gather(*(asyncio.shield(future) for future in futures.values()))
+        return {key: value for key, value in zip(futures, values) if value is not _MISSING}
+
+    async def _run(self, owned: dict, fetch: Callable[[list], Awaitable[dict]]):
+        try:
+            values = await fetch(list(owned))
+        except asyncio.CancelledError:
+            for future in owned.values():
+                future.cancel()
+            raise
+        except Exception as e:
+            for future in owned.values():
+                future.set_exception(e)
+        else:
+            for key, future in owned.items():
+                future.set_result(values.get(key, _MISSING))
+        finally:
+            for key, future in owned.items():
+                if self._in_flight.get(key) is future:
+                    del self._in_flight[key]
+
+    def stats(self) -> dict:
+        return {
+            "in_flight": len(self._in_flight),
+            "requested": self.requested,
+            "coalesced": self.coalesced,
+            "merged_batches": self.merged_batches,
+            "fetches": self.fetches,
+        }
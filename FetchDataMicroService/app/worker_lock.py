@@ -0,0 +1,50 @@
+import os
+import fcntl
+from typing import Optional, TextIO
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Taken by the one worker process that runs the jobs shared by every worker on the host
+BACKGROUND_LOCK_PATH = os.getenv("BACKGROUND_LOCK_PATH", "data/background.lock")
+
+
+class WorkerLock:
+    """
+    Non-blocking file lock electing a single worker among the gunicorn workers.
+    The worker keeps it until it exits, then the next worker that asks takes it over.
+    """
+
+    def __init__(self, path: str = BACKGROUND_LOCK_PATH):
+        self.path = path
+        self._file: Optional[TextIO] = None
+
+    @property
+    def held(self) -> bool:
+        return self._file is not None
+
+    def acquire(self) -> bool:
+        """Take the lock if no other worker holds it, return whether this worker holds it."""
+        if self._file is not None:
+            return True
+
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        file = open(self.path, "a")
+        try:
+            fcntl.flock(file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            file.close()
+            return False
+
+        self._file = file
+        return True
+
+    def release(self):
+        if self._file is not None:
+            fcntl.flock(self._file, fcntl.LOCK_UN)
+            self._file.close()
+            self._file = None
@@ -0,0 +1,45 @@
+import io
+import unittest
+from unittest import mock
+
+from PIL import Image
+
+from app.coingecko import CoinGeckoAPI
+
+
+def png_bytes() -> bytes:
+    buffer = io.BytesIO()
+    Image.new("RGBA", (256, 256), (255, 0, 0, 255)).save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+class IconIndexTests(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.api = CoinGeckoAPI()
+        self.minio = self.api.minio_client
+        self.minio.client = mock.AsyncMock()
+        self.minio.index_ready = True
+        self.api._download_coin_icon = mock.AsyncMock(return_value=png_bytes())
+
+    async def test_new_coin_is_stored_without_existence_checks(self):
+        url = await self.api.fetch_and_save_coin_icon("new", 64, "webp")
+
+        self.assertIsNotNone(url)
+        self.minio.client.head_object.assert_not_called()
+        self.minio.client.get_paginator.assert_not_called()
+        self.api._download_coin_icon.assert_awaited_once()
+
+    async def test_stored_icon_is_answered_from_the_index(self):
+        await self.api.fetch_and_save_coin_icon("new", 64, "webp")
+        self.minio.client.reset_mock()
+
+        url = await self.api.fetch_and_save_coin_icon("new", 64, "webp")
+
+        self.assertIsNotNone(url)
+        self.assertEqual(self.minio.client.method_calls, [])
+        self.api._download_coin_icon.assert_awaited_once()
+
+
+if __name__ == "__main__":
+    unittest.main()
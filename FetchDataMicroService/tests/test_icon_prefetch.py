@@ -0,0 +1,28 @@
+import unittest
+from unittest import mock
+
+from app.coingecko import CoinGeckoAPI
+
+
+class PrefetchTopIconsTests(unittest.IsolatedAsyncioTestCase):
+
+    async def test_highest_ranked_coin_keeps_a_shared_symbol(self):
+        api = CoinGeckoAPI()
+        markets = [
+            {"id": "bitcoin", "symbol": "btc", "image": "https://img/bitcoin.png"},
+            {"id": "ethereum", "symbol": "eth", "image": "https://img/ethereum.png"},
+            {"id": "fake-bitcoin", "symbol": "BTC", "image": "https://img/fake.png"},
+        ]
+        api._get_json = mock.AsyncMock(return_value=markets)
+        api.get_coin_icons = mock.AsyncMock(return_value={"btc": "url", "eth": "url"})
+
+        await api.prefetch_top_icons(3)
+
+        coins, = api.get_coin_icons.call_args.args
+        icon_urls = api.get_coin_icons.call_args.kwargs["icon_urls"]
+        self.assertEqual(coins, ["btc", "eth"])
+        self.assertEqual(icon_urls["btc"], "https://img/bitcoin.png")
+
+
+if __name__ == "__main__":
+    unittest.main()
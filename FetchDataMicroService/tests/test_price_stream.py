@@ -0,0 +1,41 @@
+import unittest
+from unittest import mock
+
+from fastapi import HTTPException
+
+from app import api as routes
+from app.coingecko import CoinGeckoAPI
+
+
+class PriceStreamTests(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.api = CoinGeckoAPI()
+        self.api.validate_coin_symbol = mock.AsyncMock(side_effect=lambda symbol: (True, symbol.lower()))
+        self.api._get_prices = mock.AsyncMock(return_value={})
+        patcher = mock.patch.object(routes, "api", self.api)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    async def test_stream_never_started_leaves_no_subscription(self):
+        request = mock.Mock(is_disconnected=mock.AsyncMock(return_value=True))
+
+        response = await routes.stream_prices(request, ["BTC", "ETH"])
+
+        self.assertEqual(self.api.broadcaster.count, 0)
+        self.assertEqual([chunk async for chunk in response.body_iterator], [])
+        self.assertEqual(self.api.broadcaster.count, 0)
+        self.assertEqual(self.api.broadcaster.subscriptions, {})
+
+    async def test_too_many_symbols_are_rejected_before_validation(self):
+        symbols = [f"COIN{i}" for i in range(self.api.broadcaster.max_symbols + 1)]
+
+        with self.assertRaises(HTTPException) as raised:
+            await self.api.resolve_stream_symbols(symbols)
+
+        self.assertEqual(raised.exception.status_code, 429)
+        self.api.validate_coin_symbol.assert_not_called()
+
+
+if __name__ == "__main__":
+    unittest.main()
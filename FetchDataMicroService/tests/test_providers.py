@@ -0,0 +1,66 @@
+import asyncio
+import unittest
+
+from app.circuit_breaker import CircuitOpenError
+from app.providers import HedgedPriceFetcher, PriceProvider
+
+
+class FakeProvider(PriceProvider):
+
+    def __init__(self, name, prices=None, error=None, delay=0.0):
+        super().__init__(api=None)
+        self.name = name
+        self.prices = prices or {}
+        self.error = error
+        self.delay = delay
+        self.calls = 0
+
+    async def fetch_prices(self, coin_ids, priority):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        if self.error:
+            raise self.error
+        return {coin_id: self.prices[coin_id] for coin_id in coin_ids if coin_id in self.prices}
+
+
+class HedgedPriceFetcherTests(unittest.IsolatedAsyncioTestCase):
+
+    async def test_primary_answer_skips_hedges(self):
+        primary = FakeProvider("primary", {"bitcoin": 1.0})
+        hedge = FakeProvider("hedge", {"bitcoin": 2.0})
+
+        prices = await HedgedPriceFetcher([primary, hedge]).fetch(["bitcoin"], 0)
+
+        self.assertEqual(prices, {"bitcoin": 1.0})
+        self.assertEqual(hedge.calls, 0)
+
+    async def test_primary_failing_immediately_falls_back_to_hedges(self):
+        primary = FakeProvider("primary", error=CircuitOpenError("open"))
+        hedge = FakeProvider("hedge", {"bitcoin": 2.0})
+        fetcher = HedgedPriceFetcher([primary, hedge])
+
+        prices = await fetcher.fetch(["bitcoin"], 0)
+
+        self.assertEqual(prices, {"bitcoin": 2.0})
+        self.assertEqual(hedge.calls, 1)
+        self.assertEqual(fetcher.hedges_sent, 1)
+
+    async def test_every_provider_failing_raises_the_primary_error(self):
+        primary = FakeProvider("primary", error=CircuitOpenError("open"))
+        hedge = FakeProvider("hedge", error=ValueError("down"))
+
+        with self.assertRaises(CircuitOpenError):
+            await HedgedPriceFetcher([primary, hedge]).fetch(["bitcoin"], 0)
+
+    async def test_slow_primary_is_hedged(self):
+        primary = FakeProvider("primary", {"bitcoin": 1.0}, delay=1.0)
+        hedge = FakeProvider("hedge", {"bitcoin": 2.0})
+        primary.stats.latencies.extend([0.01] * 20)
+
+        prices = await HedgedPriceFetcher([primary, hedge]).fetch(["bitcoin"], 0)
+
+        self.assertEqual(prices, {"bitcoin": 2.0})
+
+
+if __name__ == "__main__":
+    unittest.main()
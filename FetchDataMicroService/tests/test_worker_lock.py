@@ -0,0 +1,36 @@
+import os
+import tempfile
+import unittest
+
+from app.worker_lock import WorkerLock
+
+
+class WorkerLockTests(unittest.TestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, "locks", "background.lock")
+
+    def test_one_holder_at_a_time(self):
+        first, second = WorkerLock(self.path), WorkerLock(self.path)
+        self.addCleanup(first.release)
+        self.addCleanup(second.release)
+
+        self.assertTrue(first.acquire())
+        self.assertTrue(first.acquire())
+        self.assertFalse(second.acquire())
+        self.assertFalse(second.held)
+
+    def test_released_lock_is_taken_over(self):
+        first, second = WorkerLock(self.path), WorkerLock(self.path)
+        self.addCleanup(second.release)
+
+        first.acquire()
+        first.release()
+
+        self.assertTrue(second.acquire())
+
+
+if __name__ == "__main__":
+    unittest.main()
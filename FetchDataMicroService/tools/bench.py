@@ -0,0 +1,158 @@
+"""
+Load benchmark of the price microservice, best run against tools/fake_coingecko.py.
+
+    python -m tools.bench --endpoint multiple_prices --concurrency 50 --requests 2000 \
+        --upstream http://127.0.0.1:8090/
+
+Reports throughput, latency percentiles, response statuses and, with --upstream,
+how many calls reached the upstream during the run.
+"""
+import json
+import time
+import random
+import asyncio
+import argparse
+from collections import Counter
+from typing import Optional
+
+import aiohttp
+
+ENDPOINTS = ("multiple_prices", "coin_price", "coin_icon")
+
+
+def percentile(sorted_values: list[float], fraction: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(fraction * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+async def upstream_calls(session: aiohttp.ClientSession, upstream: Optional[str]) -> Counter:
+    if not upstream:
+        return Counter()
+    async with session.get(f"{upstream.rstrip('/')}/__stats") as response:
+        return Counter(await response.json())
+
+
+async def pick_symbols(session: aiohttp.ClientSession, args) -> list[str]:
+    """Symbols given on the command line, or the top coins of the fake upstream."""
+    if args.symbols:
+        return [symbol.strip() for symbol in args.symbols.split(",") if symbol.strip()]
+    if not args.upstream:
+        raise SystemExit("Pass --symbols or --upstream to choose the coins to request")
+
+    url = f"{args.upstream.rstrip('/')}/api/v3/coins/markets?vs_currency=usd&per_page={args.coins}&page=1"
+    async with session.get(url) as response:
+        response.raise_for_status()
+        return [coin["symbol"] for coin in await response.json()]
+
+
+def build_request(endpoint: str, base_url: str, symbols: list[str], rng: random.Random, args) -> tuple[str, list]:
+    if endpoint == "multiple_prices":
+        batch = rng.sample(symbols, min(args.batch, len(symbols)))
+        return f"{base_url}/multiple_prices", [("coin_symbols", symbol) for symbol in batch]
+    if endpoint == "coin_price":
+        return f"{base_url}/coin_price/{rng.choice(symbols)}", []
+    params = [("size", str(args.icon_size)), ("format", args.icon_format)] if args.icon_size else []
+    return f"{base_url}/coin_icon/{rng.choice(symbols)}", params
+
+
+async def run(endpoint: str, session: aiohttp.ClientSession, symbols: list[str], args) -> dict:
+    base_url = args.base_url.rstrip("/")
+    rng = random.Random(args.seed)
+    latencies, statuses = [], Counter()
+    remaining = args.requests
+    deadline = time.monotonic() + args.duration if args.duration else None
+
+    async def worker():
+        nonlocal remaining
+        while True:
+            if deadline is not None:
+                if time.monotonic() >= deadline:
+                    return
+            elif remaining <= 0:
+                return
+            remaining -= 1
+
+            url, params = build_request(endpoint, base_url, symbols, rng, args)
+            started = time.perf_counter()
+            try:
+                async with session.get(url, params=params) as response:
+                    await response.read()
+                    statuses[str(response.status)] += 1
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                statuses[type(e).__name__] += 1
+            latencies.append(time.perf_counter() - started)
+
+    before = await upstream_calls(session, args.upstream)
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+    elapsed = time.perf_counter() - started
+    after = await upstream_calls(session, args.upstream)
+
+    latencies.sort()
+    upstream = after - before
+    return {
+        "endpoint": endpoint,
+        "concurrency": args.concurrency,
+        "requests": len(latencies),
+        "seconds": round(elapsed, 3),
+        "throughput": round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+        "latency_ms": {name: round(percentile(latencies, fraction) * 1000, 1)
+                       for name, fraction in (("p50", 0.5), ("p90", 0.9), ("p99", 0.99), ("max", 1.0))},
+        "statuses": dict(statuses),
+        "upstream_calls": dict(upstream) if args.upstream else None,
+    }
+
+
+def report(result: dict):
+    latency = result["latency_ms"]
+    print(f"{result['endpoint']}: {result['requests']} requests in {result['seconds']}s "
+          f"at concurrency {result['concurrency']}, {result['throughput']} req/s")
+    print(f"  latency ms  p50 {latency['p50']}  p90 {latency['p90']}  p99 {latency['p99']}  max {latency['max']}")
+    print(f"  statuses    {result['statuses']}")
+    if result["upstream_calls"] is not None:
+        upstream = result["upstream_calls"]
+        print(f"  upstream    {upstream.get('total', 0)} calls, {upstream.get('429', 0)} rate limited, "
+              f"{upstream.get('500', 0)} failed  {upstream}")
+
+
+async def main(args):
+    timeout = aiohttp.ClientTimeout(total=args.timeout)
+    connector = aiohttp.TCPConnector(limit=args.concurrency)
+    async with aiohttp.ClientSession(timeout=timeout, connector=connector) as session:
+        symbols = await pick_symbols(session, args)
+        endpoints = ENDPOINTS if args.endpoint == "all" else (args.endpoint,)
+
+        results = []
+        for endpoint in endpoints:
+            result = await run(endpoint, session, symbols, args)
+            results.append(result)
+            if not args.json:
+                report(result)
+
+        if args.json:
+            print(json.dumps(results, indent=2))
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", default="http://127.0.0.1:8081", help="URL of the price microservice")
+    parser.add_argument("--upstream", help="URL of the fake upstream, used for symbols and upstream call counts")
+    parser.add_argument("--endpoint", choices=(*ENDPOINTS, "all"), default="all")
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--requests", type=int, default=1000, help="Requests per endpoint")
+    parser.add_argument("--duration", type=float, help="Run each endpoint for this many seconds instead")
+    parser.add_argument("--symbols", help="Comma separated coin symbols to request")
+    parser.add_argument("--coins", type=int, default=100, help="Top coins of the upstream to request")
+    parser.add_argument("--batch", type=int, default=20, help="Symbols per /multiple_prices request")
+    parser.add_argument("--icon-size", type=int, help="Request a resized icon variant")
+    parser.add_argument("--icon-format", default="webp")
+    parser.add_argument("--timeout", type=float, default=30)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", action="store_true", help="Print the results as JSON")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    asyncio.run(main(parse_args()))
@@ -0,0 +1,230 @@
+"""
+Offline stand-in for the CoinGecko API, for local development and benchmarks.
+
+    uvicorn tools.fake_coingecko:app --port 8090
+    COINGECKOAPI=http://127.0.0.1:8090/ uvicorn app.main:app --port 8081
+
+Binance tickers are served too, set BINANCE_API to the same URL to hedge against it.
+
+Behaviour is configured through FAKE_* environment variables, see below.
+Run a single worker, the upstream call counters on /__stats live in the process.
+"""
+import os
+import json
+import math
+import time
+import random
+import asyncio
+import hashlib
+from io import BytesIO
+from collections import Counter, deque
+from typing import Optional
+
+from fastapi import FastAPI, Query, Request
+from fastapi.responses import JSONResponse, Response
+from PIL import Image
+
+# Response time of every upstream call, normally distributed and clipped at zero
+FAKE_LATENCY_MS = float(os.getenv("FAKE_LATENCY_MS", 150))
+FAKE_LATENCY_JITTER_MS = float(os.getenv("FAKE_LATENCY_JITTER_MS", 50))
+# Share of calls answered with a 500
+FAKE_ERROR_RATE = float(os.getenv("FAKE_ERROR_RATE", 0))
+# Calls per minute before answering 429 like the demo plan does, 0 disables the limit
+FAKE_RATE_LIMIT_PER_MINUTE = int(os.getenv("FAKE_RATE_LIMIT_PER_MINUTE", 30))
+# Share of calls answered with a 429 regardless of the limit
+FAKE_429_RATE = float(os.getenv("FAKE_429_RATE", 0))
+FAKE_RETRY_AFTER = int(os.getenv("FAKE_RETRY_AFTER", 5))
+# Catalog: a JSON file with [{"id", "symbol", "name"}] or this many generated coins
+FAKE_CATALOG_FILE = os.getenv("FAKE_CATALOG_FILE")
+FAKE_CATALOG_SIZE = int(os.getenv("FAKE_CATALOG_SIZE", 2000))
+FAKE_SEED = int(os.getenv("FAKE_SEED", 42))
+
+WELL_KNOWN_COINS = [
+    ("bitcoin", "btc", "Bitcoin"),
+    ("ethereum", "eth", "Ethereum"),
+    ("tether", "usdt", "Tether"),
+    ("binancecoin", "bnb", "BNB"),
+    ("solana", "sol", "Solana"),
+    ("ripple", "xrp", "XRP"),
+    ("usd-coin", "usdc", "USDC"),
+    ("dogecoin", "doge", "Dogecoin"),
+    ("cardano", "ada", "Cardano"),
+    ("tron", "trx", "TRON"),
+]
+
+HOUR_MS = 60 * 60 * 1000
+DAY_MS = 24 * HOUR_MS
+
+
+def load_catalog() -> list[dict]:
+    """Coins ordered by market cap rank, each with a stable base price."""
+    if FAKE_CATALOG_FILE:
+        with open(FAKE_CATALOG_FILE) as file:
+            coins = [dict(coin) for coin in json.load(file)]
+    else:
+        coins = [{"id": coin_id, "symbol": symbol, "name": name} for coin_id, symbol, name in WELL_KNOWN_COINS]
+        coins += [{"id": f"fake-coin-{number}", "symbol": f"fk{number}", "name": f"Fake Coin {number}"}
+                  for number in range(1, max(0, FAKE_CATALOG_SIZE - len(coins)) + 1)]
+
+    rng = random.Random(FAKE_SEED)
+    for rank, coin in enumerate(coins, start=1):
+        coin["market_cap_rank"] = rank
+        coin.setdefault("base_price", round(10 ** rng.uniform(-4, 4.8), 8))
+    return coins
+
+
+CATALOG = load_catalog()
+COINS = {coin["id"]: coin for coin in CATALOG}
+
+app = FastAPI(title="Fake CoinGecko API")
+calls: Counter = Counter()
+recent_calls: deque = deque()
+_icons: dict[str, bytes] = {}
+
+
+def price_at(coin: dict, timestamp: float) -> float:
+    """A deterministic wobble around the base price, so repeated reads move a little."""
+    phase = int(hashlib.sha256(coin["id"].encode()).hexdigest()[:8], 16) % 1000
+    return round(coin["base_price"] * (1 + 0.02 * math.sin(timestamp / 600 + phase)), 8)
+
+
+def _rate_limited() -> Optional[int]:
+    """Retry-After seconds if this call exceeds the per minute limit, None otherwise."""
+    if FAKE_429_RATE and random.random() < FAKE_429_RATE:
+        return FAKE_RETRY_AFTER
+    if not FAKE_RATE_LIMIT_PER_MINUTE:
+        return None
+
+    now = time.monotonic()
+    while recent_calls and now - recent_calls[0] >= 60:
+        recent_calls.popleft()
+    if len(recent_calls) >= FAKE_RATE_LIMIT_PER_MINUTE:
+        return math.ceil(60 - (now - recent_calls[0]))
+    recent_calls.append(now)
+    return None
+
+
+@app.middleware("http")
+async def simulate_upstream(request: Request, call_next):
+    """Count every upstream call and add latency, errors and 429s to it."""
+    if request.url.path.startswith("/__"):
+        return await call_next(request)
+
+    calls["total"] += 1
+    await asyncio.sleep(max(0.0, random.gauss(FAKE_LATENCY_MS, FAKE_LATENCY_JITTER_MS)) / 1000)
+
+    retry_after = _rate_limited()
+    if retry_after is not None:
+        calls["429"] += 1
+        return JSONResponse({"status": {"error_code": 429, "error_message": "Rate limit exceeded"}},
+                            status_code=429, headers={"Retry-After": str(retry_after)})
+    if FAKE_ERROR_RATE and random.random() < FAKE_ERROR_RATE:
+        calls["500"] += 1
+        return JSONResponse({"error": "Simulated upstream failure"}, status_code=500)
+
+    response = await call_next(request)
+    route = request.scope.get("route")
+    calls[route.path if route else request.url.path] += 1
+    return response
+
+
+@app.get("/__stats")
+async def stats():
+    """Upstream calls by route, plus the total and the simulated 429s and 500s."""
+    return dict(calls)
+
+
+@app.post("/__reset")
+async def reset():
+    calls.clear()
+    recent_calls.clear()
+    return {"reset": True}
+
+
+@app.get("/api/v3/coins/list")
+async def coins_list():
+    return [{"id": coin["id"], "symbol": coin["symbol"], "name": coin["name"]} for coin in CATALOG]
+
+
+@app.get("/api/v3/coins/markets")
+async def coins_markets(request: Request, per_page: int = 100, page: int = 1):
+    now = time.time()
+    start = (page - 1) * per_page
+    return [
+        {
+            "id": coin["id"],
+            "symbol": coin["symbol"],
+            "name": coin["name"],
+            "image": f"{request.base_url}icons/{coin['id']}.png",
+            "current_price": price_at(coin, now),
+            "market_cap_rank": coin["market_cap_rank"],
+        }
+        for coin in CATALOG[start:start + per_page]
+    ]
+
+
+@app.get("/api/v3/search")
+async def search(query: str = ""):
+    query = query.lower()
+    matches = [coin for coin in CATALOG
+               if coin["symbol"] == query or coin["id"].startswith(query) or coin["name"].lower().startswith(query)]
+    return {"coins": [{"id": coin["id"], "name": coin["name"], "symbol": coin["symbol"].upper(),
+                       "market_cap_rank": coin["market_cap_rank"]} for coin in matches[:25]]}
+
+
+@app.get("/api/v3/simple/price")
+async def simple_price(ids: str = "", vs_currencies: str = "usd"):
+    now = time.time()
+    return {coin_id: {"usd": price_at(COINS[coin_id], now)} for coin_id in ids.split(",") if coin_id in COINS}
+
+
+@app.get("/api/v3/coins/{coin_id}")
+async def coin_detail(request: Request, coin_id: str):
+    coin = COINS.get(coin_id)
+    if not coin:
+        return JSONResponse({"error": "coin not found"}, status_code=404)
+    image = f"{request.base_url}icons/{coin_id}.png"
+    return {"id": coin_id, "symbol": coin["symbol"], "name": coin["name"],
+            "image": {"thumb": image, "small": image, "large": image}}
+
+
+@app.get("/api/v3/coins/{coin_id}/market_chart")
+async def market_chart(coin_id: str, days: int = Query(1, ge=1), interval: Optional[str] = None):
+    """Samples every 5 minutes for a day, hourly up to 90 days and daily beyond, like the upstream."""
+    coin = COINS.get(coin_id)
+    if not coin:
+        return JSONResponse({"error": "coin not found"}, status_code=404)
+
+    if interval == "daily" or days > 90:
+        step = DAY_MS
+    elif days > 1:
+        step = HOUR_MS
+    else:
+        step = 5 * 60 * 1000
+
+    now_ms = int(time.time() * 1000)
+    first = (now_ms - days * DAY_MS) // step * step + step
+    samples = [[ts, price_at(coin, ts / 1000)] for ts in range(first, now_ms, step)]
+    samples.append([now_ms, price_at(coin, now_ms / 1000)])
+    return {"prices": samples}
+
+
+@app.get("/api/v3/ticker/price")
+async def binance_tickers():
+    """Binance style tickers, so the fake can also stand in for the binance price provider."""
+    now = time.time()
+    return [{"symbol": f"{coin['symbol'].upper()}USDT", "price": f"{price_at(coin, now + 1):.8f}"}
+            for coin in CATALOG if coin["symbol"] != "usdt"]
+
+
+@app.get("/icons/{coin_id}.png")
+async def icon(coin_id: str):
+    """A 250px square in a colour derived from the coin id."""
+    if coin_id not in COINS:
+        return Response(status_code=404)
+    if coin_id not in _icons:
+        colour = tuple(hashlib.sha256(coin_id.encode()).digest()[:3])
+        buffer = BytesIO()
+        Image.new("RGB", (250, 250), colour).save(buffer, "PNG")
+        _icons[coin_id] = buffer.getvalue()
+    return Response(_icons[coin_id], media_type="image/png")